@@ -1,8 +1,9 @@
 import os
 import logging
-from flask import Flask, render_template, request, redirect, url_for, session, flash
+from datetime import datetime
+from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify
 from functools import wraps
-from models import User, Produk, Kategori
+from models import User, Produk, Kategori, Promo, HargaEfektif, HargaEfektifError, audit_log
 from pymysql import err as pymysql_err
 
 logger = logging.getLogger(__name__)
@@ -20,6 +21,8 @@ app.secret_key = os.getenv('SECRET_KEY', 'toko_sembako_secret_key_2025_change_in
 app.config['SESSION_COOKIE_SECURE'] = os.getenv('FLASK_ENV') == 'production'
 app.config['SESSION_COOKIE_HTTPONLY'] = True
 app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
+# Batas jumlah kode per request /produk/scan
+SCAN_MAX_KODE = int(os.getenv('SCAN_MAX_KODE', 100))
 
 
 def login_required(f):
@@ -45,6 +48,16 @@ def admin_required(f):
 
 
 
+def audit(aksi, tabel, id_record=None, sebelum=None, sesudah=None):
+    """Catat perubahan data oleh user yang sedang login (non-blocking)."""
+    try:
+        audit_log.log(session.get('user_id'), session.get('username'), aksi, tabel,
+                      id_record, sebelum, sesudah)
+    except Exception:
+        logger.exception('Gagal mencatat audit %s %s', aksi, tabel)
+
+
+
 @app.context_processor
 def inject_user():
     return {
@@ -187,7 +200,10 @@ def create_kategori():
             return render_template('create_kategori.html')
 
         try:
-            Kategori.create_kategori(kode_kategori, nama_kategori, deskripsi, lokasi_rak)
+            id_kategori = Kategori.create_kategori(kode_kategori, nama_kategori, deskripsi, lokasi_rak)
+            audit('create', 'kategori', id_kategori, sesudah={'kode_kategori': kode_kategori,
+                                                              'nama_kategori': nama_kategori,
+                                                              'deskripsi': deskripsi, 'lokasi_rak': lokasi_rak})
             flash('Kategori berhasil ditambahkan!', 'success')
             return redirect(url_for('read_kategori'))
         except Exception as e:
@@ -195,7 +211,7 @@ def create_kategori():
 
     return render_template('create_kategori.html')
 
-@app.route('/kategori/update/<int:id>', methods=['GET', 'POST'])
+@app.route('/kategori/update/<int(signed=True):id>', methods=['GET', 'POST'])
 @admin_required
 def update_kategori(id):
     kategori = Kategori.get_kategori_by_id(id)
@@ -215,6 +231,8 @@ def update_kategori(id):
 
         try:
             Kategori.update_kategori(id, kode_kategori, nama_kategori, deskripsi, lokasi_rak)
+            audit('update', 'kategori', id, kategori, {'kode_kategori': kode_kategori, 'nama_kategori': nama_kategori,
+                                                       'deskripsi': deskripsi, 'lokasi_rak': lokasi_rak})
             flash('Kategori berhasil diperbarui!', 'success')
             return redirect(url_for('read_kategori'))
         except Exception as e:
@@ -222,11 +240,13 @@ def update_kategori(id):
 
     return render_template('update_kategori.html', kategori=kategori)
 
-@app.route('/kategori/delete/<int:id>')
+@app.route('/kategori/delete/<int(signed=True):id>')
 @admin_required
 def delete_kategori(id):
     try:
+        kategori = Kategori.get_kategori_by_id(id)
         Kategori.delete_kategori(id)
+        audit('delete', 'kategori', id, sebelum=kategori)
         flash('Kategori beserta produk terkait berhasil dihapus!', 'success')
     except Exception as e:
         flash(f'Gagal menghapus kategori: {str(e)}', 'danger')
@@ -243,7 +263,12 @@ def read_produk():
         logger.exception('DB error saat mengambil produk')
         flash('Gagal memuat data produk.', 'danger')
         produk_list = []
-    return render_template('read_produk.html', produk_list=produk_list)
+    try:
+        tier_map = HargaEfektif.get_tier_map()
+    except Exception:
+        logger.exception('DB error saat mengambil harga promo')
+        tier_map = {}
+    return render_template('read_produk.html', produk_list=produk_list, tier_map=tier_map)
 
 @app.route('/produk/create', methods=['GET', 'POST'])
 @admin_required
@@ -262,15 +287,21 @@ def create_produk():
             return render_template('create_produk.html', kategori_list=kategori_list)
 
         try:
-            Produk.create_produk(kode_produk, nama, int(harga), int(stok), int(kategori_id))
+            id_produk = Produk.create_produk(kode_produk, nama, int(harga), int(stok), int(kategori_id))
+            audit('create', 'produk', id_produk, sesudah={'kode_produk': kode_produk, 'nama': nama,
+                                                          'harga': int(harga),
+                                                          'stok': int(stok), 'kategori_id': int(kategori_id)})
             flash('Produk berhasil ditambahkan!', 'success')
             return redirect(url_for('read_produk'))
         except Exception as e:
-            flash(f'Gagal menambahkan produk: {str(e)}', 'danger')
+            if isinstance(e, pymysql_err.IntegrityError) and e.args and e.args[0] == 1062:
+                flash(f'Kode produk {kode_produk} sudah digunakan produk lain.', 'danger')
+            else:
+                flash(f'Gagal menambahkan produk: {str(e)}', 'danger')
 
     return render_template('create_produk.html', kategori_list=kategori_list)
 
-@app.route('/produk/update/<int:id>', methods=['GET', 'POST'])
+@app.route('/produk/update/<int(signed=True):id>', methods=['GET', 'POST'])
 @admin_required
 def update_produk(id):
     produk = Produk.get_produk_by_id(id)
@@ -293,24 +324,183 @@ def update_produk(id):
 
         try:
             Produk.update_produk(id, kode_produk, nama, int(harga), int(stok), int(kategori_id))
+            audit('update', 'produk', id, produk, {'kode_produk': kode_produk, 'nama': nama, 'harga': int(harga),
+                                                   'stok': int(stok), 'kategori_id': int(kategori_id)})
             flash('Produk berhasil diperbarui!', 'success')
             return redirect(url_for('read_produk'))
         except Exception as e:
-            flash(f'Gagal memperbarui produk: {str(e)}', 'danger')
+            if isinstance(e, pymysql_err.IntegrityError) and e.args and e.args[0] == 1062:
+                flash(f'Kode produk {kode_produk} sudah digunakan produk lain.', 'danger')
+            else:
+                flash(f'Gagal memperbarui produk: {str(e)}', 'danger')
 
     return render_template('update_produk.html', produk=produk, kategori_list=kategori_list)
 
-@app.route('/produk/delete/<int:id>')
+@app.route('/produk/scan', methods=['GET', 'POST'])
+@login_required
+def scan_produk():
+    """Lookup barcode untuk kasir. Bisa banyak kode sekaligus: ?kode=A&kode=B,
+    POST JSON {"kode": ["A", "B"]} atau POST JSON ["A", "B"]."""
+    kode_list = request.args.getlist('kode')
+    if request.method == 'POST':
+        data = request.get_json(silent=True)
+        if isinstance(data, list):
+            kode = data
+        elif isinstance(data, dict):
+            kode = data.get('kode', [])
+        else:
+            kode = request.form.getlist('kode')
+        kode_list = kode if isinstance(kode, list) else [kode]
+    kode_list = [str(k).strip() for k in kode_list if str(k).strip()]
+
+    if not kode_list:
+        return jsonify({'error': 'Parameter kode harus diisi.'}), 400
+    if len(kode_list) > SCAN_MAX_KODE:
+        return jsonify({'error': f'Maksimal {SCAN_MAX_KODE} kode per scan.'}), 400
+
+    try:
+        found = Produk.get_produk_by_kode_list(kode_list)
+    except Exception:
+        logger.exception('DB error saat scan barcode')
+        return jsonify({'error': 'Terjadi kesalahan server.'}), 500
+
+    return jsonify({
+        'produk': found,
+        'tidak_ditemukan': [k for k in kode_list if k not in found]
+    })
+
+@app.route('/produk/delete/<int(signed=True):id>')
 @admin_required
 def delete_produk(id):
     try:
+        produk = Produk.get_produk_by_id(id)
         Produk.delete_produk(id)
+        audit('delete', 'produk', id, sebelum=produk)
         flash('Produk berhasil dihapus!', 'success')
     except Exception as e:
         flash(f'Gagal menghapus produk: {str(e)}', 'danger')
     return redirect(url_for('read_produk'))
 
 
+
+def _promo_form():
+    """Ambil dan validasi data promo dari form. Return (data, pesan_error)."""
+    data = {
+        'nama_promo': request.form.get('nama_promo', '').strip(),
+        'tipe': request.form.get('tipe', ''),
+        'nilai': request.form.get('nilai', '').strip(),
+        'min_qty': request.form.get('min_qty', '1').strip() or '1',
+        'produk_id': request.form.get('produk_id') or None,
+        'kategori_id': request.form.get('kategori_id') or None,
+        'mulai': request.form.get('mulai') or None,
+        'selesai': request.form.get('selesai') or None,
+        'aktif': 1 if request.form.get('aktif') == '1' else 0,
+    }
+    if not all([data['nama_promo'], data['tipe'], data['nilai']]):
+        return data, 'Nama, tipe dan nilai promo harus diisi.'
+    if data['tipe'] not in Promo.TIPE:
+        return data, 'Tipe promo tidak valid.'
+    try:
+        data['nilai'] = int(data['nilai'])
+        data['min_qty'] = int(data['min_qty'])
+        data['produk_id'] = int(data['produk_id']) if data['produk_id'] else None
+        data['kategori_id'] = int(data['kategori_id']) if data['kategori_id'] else None
+        data['mulai'] = datetime.fromisoformat(data['mulai']) if data['mulai'] else None
+        data['selesai'] = datetime.fromisoformat(data['selesai']) if data['selesai'] else None
+    except ValueError:
+        return data, 'Format angka atau tanggal tidak valid.'
+    if data['nilai'] < 0 or data['min_qty'] < 1:
+        return data, 'Nilai promo tidak boleh negatif dan minimal qty adalah 1.'
+    if data['tipe'] == 'persen' and data['nilai'] > 100:
+        return data, 'Diskon persen maksimal 100.'
+    if data['mulai'] and data['selesai'] and data['mulai'] >= data['selesai']:
+        return data, 'Waktu selesai harus setelah waktu mulai.'
+    return data, None
+
+@app.route('/promo')
+@admin_required
+def read_promo():
+    try:
+        promo_list = Promo.get_all_promo()
+    except Exception:
+        logger.exception('DB error saat mengambil promo')
+        flash('Gagal memuat data promo.', 'danger')
+        promo_list = []
+    return render_template('read_promo.html', promo_list=promo_list)
+
+@app.route('/promo/create', methods=['GET', 'POST'])
+@admin_required
+def create_promo():
+    produk_list = Produk.get_all_produk()
+    kategori_list = Kategori.get_all_kategori()
+
+    if request.method == 'POST':
+        data, error = _promo_form()
+        if error:
+            flash(error, 'warning')
+            return render_template('create_promo.html', produk_list=produk_list, kategori_list=kategori_list)
+
+        try:
+            id_promo = Promo.create_promo(**data)
+            audit('create', 'promo', id_promo, sesudah=data)
+            flash('Promo berhasil ditambahkan!', 'success')
+            return redirect(url_for('read_promo'))
+        except HargaEfektifError as e:
+            audit('create', 'promo', e.id_record, sesudah=data)
+            flash(f'Promo tersimpan, tetapi harga promo gagal dihitung ulang: {str(e)}', 'danger')
+            return redirect(url_for('read_promo'))
+        except Exception as e:
+            flash(f'Gagal menambahkan promo: {str(e)}', 'danger')
+
+    return render_template('create_promo.html', produk_list=produk_list, kategori_list=kategori_list)
+
+@app.route('/promo/update/<int:id>', methods=['GET', 'POST'])
+@admin_required
+def update_promo(id):
+    promo = Promo.get_promo_by_id(id)
+    produk_list = Produk.get_all_produk()
+    kategori_list = Kategori.get_all_kategori()
+
+    if not promo:
+        flash('Promo tidak ditemukan.', 'danger')
+        return redirect(url_for('read_promo'))
+
+    if request.method == 'POST':
+        data, error = _promo_form()
+        if error:
+            flash(error, 'warning')
+            return render_template('update_promo.html', promo=promo, produk_list=produk_list, kategori_list=kategori_list)
+
+        try:
+            Promo.update_promo(id, **data)
+            audit('update', 'promo', id, promo, data)
+            flash('Promo berhasil diperbarui!', 'success')
+            return redirect(url_for('read_promo'))
+        except HargaEfektifError as e:
+            audit('update', 'promo', id, promo, data)
+            flash(f'Promo tersimpan, tetapi harga promo gagal dihitung ulang: {str(e)}', 'danger')
+            return redirect(url_for('read_promo'))
+        except Exception as e:
+            flash(f'Gagal memperbarui promo: {str(e)}', 'danger')
+
+    return render_template('update_promo.html', promo=promo, produk_list=produk_list, kategori_list=kategori_list)
+
+@app.route('/promo/delete/<int:id>')
+@admin_required
+def delete_promo(id):
+    try:
+        promo = Promo.get_promo_by_id(id)
+        Promo.delete_promo(id)
+        audit('delete', 'promo', id, sebelum=promo)
+        flash('Promo berhasil dihapus!', 'success')
+    except HargaEfektifError as e:
+        audit('delete', 'promo', id, sebelum=promo)
+        flash(f'Promo dihapus, tetapi harga promo gagal dihitung ulang: {str(e)}', 'danger')
+    except Exception as e:
+        flash(f'Gagal menghapus promo: {str(e)}', 'danger')
+    return redirect(url_for('read_promo'))
+
+
 @app.route('/user')
 @admin_required
 def read_user():
@@ -335,7 +525,8 @@ def create_user():
             return render_template('create_user.html')
 
         try:
-            User.create_user(username, password, role)
+            id_user = User.create_user(username, password, role)
+            audit('create', 'users', id_user, sesudah={'username': username, 'role': role, 'password': password})
             flash('User berhasil ditambahkan!', 'success')
             return redirect(url_for('read_user'))
         except Exception as e:
@@ -363,6 +554,7 @@ def update_user(id):
 
         try:
             User.update_user(id, username, role, password if password else None)
+            audit('update', 'users', id, user, {'username': username, 'role': role, 'password': password})
             flash('User berhasil diperbarui!', 'success')
             return redirect(url_for('read_user'))
         except Exception as e:
@@ -378,7 +570,9 @@ def delete_user(id):
         return redirect(url_for('read_user'))
 
     try:
+        target = User.get_user_by_id(id)
         User.delete_user(id)
+        audit('delete', 'users', id, sebelum=target)
         flash('User berhasil dihapus!', 'success')
     except Exception as e:
         flash(f'Gagal menghapus user: {str(e)}', 'danger')
@@ -23,6 +23,23 @@ SET time_zone = "+00:00";
 
 -- --------------------------------------------------------
 
+--
+-- Table structure for table `audit_log`
+--
+
+CREATE TABLE `audit_log` (
+  `id_audit` bigint(20) NOT NULL,
+  `id_user` int(11) DEFAULT NULL,
+  `username` varchar(50) DEFAULT NULL,
+  `aksi` varchar(10) NOT NULL,
+  `tabel` varchar(25) NOT NULL,
+  `id_record` int(11) DEFAULT NULL,
+  `perubahan` text NOT NULL,
+  `waktu` datetime NOT NULL
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='Audit trail perubahan data';
+
+-- --------------------------------------------------------
+
 --
 -- Table structure for table `kategori`
 --
@@ -134,6 +151,63 @@ INSERT INTO `produk` (`id_produk`, `kode_produk`, `nama`, `harga`, `stok`, `kate
 
 -- --------------------------------------------------------
 
+--
+-- Table structure for table `promo`
+--
+
+CREATE TABLE `promo` (
+  `id_promo` int(11) NOT NULL,
+  `nama_promo` varchar(100) NOT NULL,
+  `tipe` varchar(10) NOT NULL COMMENT 'persen | potongan | harga',
+  `nilai` int(11) NOT NULL,
+  `min_qty` int(11) NOT NULL DEFAULT 1,
+  `produk_id` int(11) DEFAULT NULL,
+  `kategori_id` int(11) DEFAULT NULL,
+  `mulai` datetime DEFAULT NULL,
+  `selesai` datetime DEFAULT NULL,
+  `aktif` tinyint(1) NOT NULL DEFAULT 1
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='Aturan promo, diskon dan harga grosir';
+
+-- --------------------------------------------------------
+
+--
+-- Table structure for table `harga_efektif`
+--
+
+CREATE TABLE `harga_efektif` (
+  `produk_id` int(11) NOT NULL,
+  `min_qty` int(11) NOT NULL,
+  `berlaku_mulai` datetime NOT NULL,
+  `berlaku_sampai` datetime NOT NULL,
+  `harga` int(11) NOT NULL,
+  `harga_dasar` int(11) NOT NULL,
+  `id_promo` int(11) DEFAULT NULL
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='Harga hasil prekomputasi promo per produk, tier dan waktu';
+
+-- --------------------------------------------------------
+
+--
+-- Table structure for table `schema_migrations`
+--
+
+CREATE TABLE `schema_migrations` (
+  `version` varchar(20) NOT NULL,
+  `nama` varchar(100) NOT NULL,
+  `applied_at` datetime NOT NULL
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+--
+-- Dumping data for table `schema_migrations`
+--
+
+INSERT INTO `schema_migrations` (`version`, `nama`, `applied_at`) VALUES
+('001', 'uk_kode_produk', '2026-10-19 00:00:00'),
+('002', 'audit_log', '2026-10-19 00:00:00'),
+('003', 'promo', '2026-10-19 00:00:00'),
+('004', 'idx_kategori_nama', '2026-10-19 00:00:00');
+
+-- --------------------------------------------------------
+
 --
 -- Table structure for table `users`
 --
@@ -190,6 +264,14 @@ INSERT INTO `users` (`id_user`, `username`, `role`, `password`) VALUES
 -- Indexes for dumped tables
 --
 
+--
+-- Indexes for table `audit_log`
+--
+ALTER TABLE `audit_log`
+  ADD PRIMARY KEY (`id_audit`),
+  ADD KEY `idx_audit_tabel_record` (`tabel`,`id_record`),
+  ADD KEY `idx_audit_waktu` (`waktu`);
+
 --
 -- Indexes for table `kategori`
 --
@@ -203,11 +285,31 @@ ALTER TABLE `kategori`
 --
 ALTER TABLE `produk`
   ADD PRIMARY KEY (`id_produk`),
-  ADD KEY `idx_kode_produk` (`kode_produk`),
+  ADD UNIQUE KEY `uk_kode_produk` (`kode_produk`),
   ADD KEY `idx_nama_produk` (`nama`),
-  ADD KEY `idx_kategori` (`kategori_id`),
+  ADD KEY `idx_kategori_nama` (`kategori_id`,`nama`),
   ADD KEY `idx_stok` (`stok`);
 
+--
+-- Indexes for table `promo`
+--
+ALTER TABLE `promo`
+  ADD PRIMARY KEY (`id_promo`),
+  ADD KEY `idx_promo_produk` (`produk_id`),
+  ADD KEY `idx_promo_kategori` (`kategori_id`);
+
+--
+-- Indexes for table `harga_efektif`
+--
+ALTER TABLE `harga_efektif`
+  ADD PRIMARY KEY (`produk_id`,`min_qty`,`berlaku_mulai`);
+
+--
+-- Indexes for table `schema_migrations`
+--
+ALTER TABLE `schema_migrations`
+  ADD PRIMARY KEY (`version`);
+
 --
 -- Indexes for table `users`
 --
@@ -220,6 +322,12 @@ ALTER TABLE `users`
 -- AUTO_INCREMENT for dumped tables
 --
 
+--
+-- AUTO_INCREMENT for table `audit_log`
+--
+ALTER TABLE `audit_log`
+  MODIFY `id_audit` bigint(20) NOT NULL AUTO_INCREMENT;
+
 --
 -- AUTO_INCREMENT for table `kategori`
 --
@@ -232,6 +340,12 @@ ALTER TABLE `kategori`
 ALTER TABLE `produk`
   MODIFY `id_produk` int(11) NOT NULL AUTO_INCREMENT, AUTO_INCREMENT=36;
 
+--
+-- AUTO_INCREMENT for table `promo`
+--
+ALTER TABLE `promo`
+  MODIFY `id_promo` int(11) NOT NULL AUTO_INCREMENT;
+
 --
 -- AUTO_INCREMENT for table `users`
 --
@@ -247,6 +361,19 @@ ALTER TABLE `users`
 --
 ALTER TABLE `produk`
   ADD CONSTRAINT `fk_produk_kategori` FOREIGN KEY (`kategori_id`) REFERENCES `kategori` (`id_kategori`) ON DELETE CASCADE ON UPDATE CASCADE;
+
+--
+-- Constraints for table `promo`
+--
+ALTER TABLE `promo`
+  ADD CONSTRAINT `fk_promo_produk` FOREIGN KEY (`produk_id`) REFERENCES `produk` (`id_produk`) ON DELETE CASCADE ON UPDATE CASCADE,
+  ADD CONSTRAINT `fk_promo_kategori` FOREIGN KEY (`kategori_id`) REFERENCES `kategori` (`id_kategori`) ON DELETE CASCADE ON UPDATE CASCADE;
+
+--
+-- Constraints for table `harga_efektif`
+--
+ALTER TABLE `harga_efektif`
+  ADD CONSTRAINT `fk_harga_efektif_produk` FOREIGN KEY (`produk_id`) REFERENCES `produk` (`id_produk`) ON DELETE CASCADE ON UPDATE CASCADE;
 COMMIT;
 
 /*!40101 SET CHARACTER_SET_CLIENT=@OLD_CHARACTER_SET_CLIENT */;
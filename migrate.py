@@ -0,0 +1,440 @@
+"""Migrasi skema database dan index advisor.
+
+Contoh:
+    python migrate.py status
+    python migrate.py up
+    python migrate.py advise --seed 100000
+    python migrate.py seed --produk 100000
+    python migrate.py seed --hapus
+"""
+
+import os
+import re
+import ast
+import sys
+import time
+import argparse
+import importlib.util
+
+import pymysql.err
+
+import models
+from models import Database, User, Produk, Kategori, Promo, HargaEfektif
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+MIGRATION_FILE = re.compile(r'^(\d{3,})_(\w+)\.py$')
+SEED_PREFIX = 'SEED-'
+
+
+class MigrationError(Exception):
+    pass
+
+
+class Migrator:
+    """Menjalankan file migrations/NNN_nama.py yang belum tercatat di schema_migrations.
+
+    Setiap file migrasi berisi fungsi up(m) yang menerima Migrator ini dan
+    memakai helper di bawah. Perubahan struktur dijalankan dengan
+    ALGORITHM=INPLACE, LOCK=NONE supaya tabel tetap bisa dibaca/ditulis
+    selama migrasi; update data besar dijalankan per chunk primary key.
+    """
+
+    def __init__(self, db=None, path=MIGRATIONS_DIR, chunk_size=1000, pause=0.05, allow_lock=False):
+        self.db = db or Database()
+        self.path = path
+        self.chunk_size = chunk_size
+        self.pause = pause
+        self.allow_lock = allow_lock
+
+    def ensure_table(self):
+        self.db.execute("""CREATE TABLE IF NOT EXISTS schema_migrations (
+                               version varchar(20) NOT NULL PRIMARY KEY,
+                               nama varchar(100) NOT NULL,
+                               applied_at datetime NOT NULL
+                           ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci""")
+
+    def available(self):
+        migrations = []
+        for filename in sorted(os.listdir(self.path)):
+            m = MIGRATION_FILE.match(filename)
+            if m:
+                migrations.append((m.group(1), m.group(2), os.path.join(self.path, filename)))
+        return migrations
+
+    def applied(self):
+        self.ensure_table()
+        rows = self.db.fetchall("SELECT version FROM schema_migrations")
+        return {row['version'] for row in rows or []}
+
+    def pending(self):
+        applied = self.applied()
+        return [migration for migration in self.available() if migration[0] not in applied]
+
+    def up(self, target=None):
+        if target is not None:
+            target = self._target_version(target)
+        done = []
+        for version, nama, path in self.pending():
+            if target is not None and int(version) > target:
+                break
+            print(f"==> {version} {nama}")
+            spec = importlib.util.spec_from_file_location(f"migration_{version}", path)
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+            module.up(self)
+            self.db.execute("INSERT INTO schema_migrations (version, nama, applied_at) VALUES (%s, %s, NOW())",
+                            (version, nama))
+            done.append(version)
+        return done
+
+    def _target_version(self, target):
+        """Nomor versi --target sebagai int; harus sama dengan salah satu file migrasi."""
+        try:
+            target = int(target)
+        except (TypeError, ValueError):
+            raise MigrationError(f"Versi target {target!r} bukan angka")
+        if target not in {int(version) for version, _, _ in self.available()}:
+            raise MigrationError(f"Tidak ada migrasi dengan versi {target}")
+        return target
+
+    # ---- helper untuk file migrasi ----
+
+    error = MigrationError
+
+    def execute(self, sql, params=None):
+        return self.db.execute(sql, params)
+
+    def fetchall(self, sql, params=None):
+        return self.db.fetchall(sql, params)
+
+    def has_table(self, table):
+        sql = """SELECT 1 FROM information_schema.tables
+                 WHERE table_schema = DATABASE() AND table_name = %s"""
+        return self.db.fetchone(sql, (table,)) is not None
+
+    def has_index(self, table, index):
+        sql = """SELECT 1 FROM information_schema.statistics
+                 WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s
+                 LIMIT 1"""
+        return self.db.fetchone(sql, (table, index)) is not None
+
+    def alter(self, table, clause):
+        """ALTER TABLE tanpa mengunci tabel. Gagal jika server tidak mendukung,
+        kecuali --allow-lock dipakai."""
+        try:
+            return self.db.execute(f"ALTER TABLE `{table}` {clause}, ALGORITHM=INPLACE, LOCK=NONE")
+        except (pymysql.err.OperationalError, pymysql.err.InternalError, pymysql.err.ProgrammingError) as e:
+            if not self.allow_lock:
+                raise MigrationError(
+                    f"ALTER TABLE {table} tidak bisa dijalankan online ({e}). "
+                    f"Jalankan ulang dengan --allow-lock saat toko tutup.")
+            print(f"    ! {table}: ALTER online tidak didukung, menjalankan dengan lock")
+            return self.db.execute(f"ALTER TABLE `{table}` {clause}")
+
+    def backfill(self, table, set_sql, where='1 = 1', pk=None, params=()):
+        """UPDATE per chunk rentang primary key supaya tidak menahan lock lama."""
+        pk = pk or self._primary_key(table)
+        bounds = self.db.fetchone(f"SELECT MIN(`{pk}`) AS awal, MAX(`{pk}`) AS akhir FROM `{table}`")
+        if not bounds or bounds['awal'] is None:
+            return 0
+        total = 0
+        awal = bounds['awal']
+        while awal <= bounds['akhir']:
+            akhir = awal + self.chunk_size - 1
+            total += self.db.execute(
+                f"UPDATE `{table}` SET {set_sql} WHERE `{pk}` BETWEEN %s AND %s AND ({where})",
+                (*params, awal, akhir))
+            awal = akhir + 1
+            time.sleep(self.pause)
+        return total
+
+    def _primary_key(self, table):
+        row = self.db.fetchone("""SELECT column_name AS kolom FROM information_schema.key_column_usage
+                                  WHERE table_schema = DATABASE() AND table_name = %s
+                                    AND constraint_name = 'PRIMARY'
+                                  ORDER BY ordinal_position LIMIT 1""", (table,))
+        if not row:
+            raise MigrationError(f"Tabel {table} tidak punya primary key")
+        return row['kolom']
+
+
+class _SampleRow(dict):
+    """Baris contoh untuk perekam; kolom lain yang tidak disebut bernilai 1."""
+
+    VALUES = {'id_user': 1, 'username': 'advisor', 'password': '', 'role': 'admin',
+              'id_kategori': 1, 'kode_kategori': 'KAT-001', 'nama_kategori': 'Beras', 'deskripsi': '-',
+              'lokasi_rak': 'A1', 'id_produk': 1, 'kode_produk': 'BRS-001', 'nama': 'Beras', 'harga': 1000,
+              'stok': 10, 'kategori_id': 1, 'id_promo': 1, 'nama_promo': 'Promo', 'tipe': 'persen',
+              'nilai': 10, 'min_qty': 1, 'produk_id': 1, 'mulai': None, 'selesai': None, 'aktif': 1,
+              'harga_dasar': 1000}
+
+    def __init__(self):
+        super().__init__(self.VALUES)
+
+    def __missing__(self, key):
+        return 1
+
+
+class _RecordingDatabase:
+    """Pengganti models.db yang hanya mencatat SQL tanpa menjalankannya.
+
+    Setiap SELECT mengembalikan satu baris contoh agar method yang memproses
+    hasil query (mis. HargaEfektif.refresh) ikut menjalankan write-nya.
+    """
+
+    offline = False
+
+    def __init__(self):
+        self.queries = []
+        self.label = None
+
+    def _record(self, sql, params):
+        self.queries.append((self.label, sql, params))
+
+    def execute(self, sql, params=None):
+        self._record(sql, params)
+        return 0
+
+    def insert(self, sql, params=None):
+        self._record(sql, params)
+        return 1
+
+    def executemany(self, sql, seq_params):
+        for params in seq_params:
+            self._record(sql, params)
+        return 0
+
+    def transaction(self, statements):
+        for sql, seq_params in statements:
+            self.executemany(sql, seq_params)
+
+    def fetchone(self, sql, params=None):
+        self._record(sql, params)
+        return _SampleRow()
+
+    def fetchall(self, sql, params=None):
+        self._record(sql, params)
+        return [_SampleRow()]
+
+
+# Panggilan contoh untuk setiap method model; parameternya dipakai untuk EXPLAIN.
+MODEL_CALLS = [
+    ('User.create_user', lambda: User.create_user('advisor', 'advisor')),
+    ('User.check_login', lambda: User.check_login('admin', 'admin')),
+    ('User.get_user_by_id', lambda: User.get_user_by_id(1)),
+    ('User.get_all_users', lambda: User.get_all_users()),
+    ('User.delete_user', lambda: User.delete_user(1)),
+    ('User.update_user', lambda: User.update_user(1, 'admin', 'admin', 'admin')),
+    ('Produk.create_produk', lambda: Produk.create_produk('BRS-001', 'Beras', 1000, 1, 1)),
+    ('Produk.get_produk_by_id', lambda: Produk.get_produk_by_id(1)),
+    ('Produk.get_produk_by_kode', lambda: Produk.get_produk_by_kode('BRS-001')),
+    ('Produk.get_produk_by_kode_list', lambda: Produk.get_produk_by_kode_list(['BRS-001'])),
+    ('Produk.get_all_produk', lambda: Produk.get_all_produk()),
+    ('Produk.get_produk_terbaru', lambda: Produk.get_produk_terbaru(5)),
+    ('Produk.delete_produk', lambda: Produk.delete_produk(1)),
+    ('Produk.update_produk', lambda: Produk.update_produk(1, 'BRS-001', 'Beras', 1000, 1, 1)),
+    ('Produk.get_produk_by_kategori', lambda: Produk.get_produk_by_kategori(1)),
+    ('Kategori.create_kategori', lambda: Kategori.create_kategori('KAT-001', 'Beras', '-', 'A1')),
+    ('Kategori.get_kategori_by_id', lambda: Kategori.get_kategori_by_id(1)),
+    ('Kategori.get_all_kategori', lambda: Kategori.get_all_kategori()),
+    ('Kategori.delete_kategori', lambda: Kategori.delete_kategori(1)),
+    ('Kategori.update_kategori', lambda: Kategori.update_kategori(1, 'KAT-001', 'Beras', '-', 'A1')),
+    ('Promo.create_promo', lambda: Promo.create_promo('Promo', 'persen', 10, produk_id=1)),
+    ('Promo.get_promo_by_id', lambda: Promo.get_promo_by_id(1)),
+    ('Promo.get_all_promo', lambda: Promo.get_all_promo()),
+    ('Promo.update_promo', lambda: Promo.update_promo(1, 'Promo', 'persen', 10, produk_id=1)),
+    ('Promo.delete_promo', lambda: Promo.delete_promo(1)),
+    ('HargaEfektif.refresh', lambda: HargaEfektif.refresh(kategori_id=1)),
+    ('HargaEfektif.get_harga', lambda: HargaEfektif.get_harga(1, 5)),
+    ('HargaEfektif.get_tier_map', lambda: HargaEfektif.get_tier_map([1, 2, 3])),
+]
+MODEL_CLASSES = ('User', 'Produk', 'Kategori', 'Promo', 'HargaEfektif')
+# Method tanpa akses database
+PURE_METHODS = ('HargaEfektif.hitung', 'HargaEfektif.build_rows')
+
+
+def collect_queries():
+    """Jalankan MODEL_CALLS dengan database perekam dan kembalikan SQL unik per method."""
+    recorder = _RecordingDatabase()
+    original, original_index = models.db, models.produk_index
+    models.db = recorder
+    # Index baru supaya lookup barcode tercatat dan baris contoh tidak tertinggal di index asli
+    models.produk_index = models.ProdukIndex()
+    try:
+        for label, call in MODEL_CALLS:
+            recorder.label = label
+            call()
+    finally:
+        models.db = original
+        models.produk_index = original_index
+
+    seen = set()
+    queries = []
+    for label, sql, params in recorder.queries:
+        sql = ' '.join(sql.split())
+        if sql in seen:
+            continue
+        seen.add(sql)
+        queries.append((label, sql, params))
+    return queries
+
+
+def uncovered_methods():
+    """Method publik di models.py yang belum ada di MODEL_CALLS."""
+    with open(models.__file__, encoding='utf-8') as f:
+        tree = ast.parse(f.read())
+    covered = {label for label, _ in MODEL_CALLS}
+    missing = []
+    for node in tree.body:
+        if isinstance(node, ast.ClassDef) and node.name in MODEL_CLASSES:
+            for item in node.body:
+                if isinstance(item, ast.FunctionDef) and not item.name.startswith('_'):
+                    name = f"{node.name}.{item.name}"
+                    if name not in covered and name not in PURE_METHODS:
+                        missing.append(name)
+    return missing
+
+
+def suggest_index(sql):
+    """Saran index komposit sederhana untuk pola WHERE kolom = ? ORDER BY kolom2."""
+    where = re.search(r'WHERE\s+(?:\w+\.)?(\w+)\s*=\s*%s', sql, re.IGNORECASE)
+    order = re.search(r'ORDER BY\s+(?:\w+\.)?(\w+)', sql, re.IGNORECASE)
+    if where and order and where.group(1) != order.group(1):
+        return f"index komposit ({where.group(1)}, {order.group(1)})"
+    if where:
+        return f"index pada kolom {where.group(1)}"
+    return None
+
+
+def advise(db, min_rows=1000):
+    """EXPLAIN setiap query model dan tandai full scan / filesort / temporary."""
+    temuan = 0
+    for label, sql, params in collect_queries():
+        if not re.match(r'\s*(SELECT|INSERT|UPDATE|DELETE)\b', sql, re.IGNORECASE):
+            continue
+        try:
+            plan = db.fetchall("EXPLAIN " + sql, params)
+        except Exception as e:
+            print(f"[?] {label}: EXPLAIN gagal ({e})")
+            continue
+
+        masalah = []
+        for row in plan or []:
+            extra = row.get('Extra') or ''
+            rows = row.get('rows') or 0
+            if row.get('type') in ('ALL', 'index') and rows >= min_rows:
+                jenis = 'full table scan' if row['type'] == 'ALL' else 'full index scan'
+                masalah.append(f"{jenis} pada {row.get('table')} (~{rows} baris)")
+            if 'Using filesort' in extra:
+                masalah.append(f"filesort pada {row.get('table')}")
+            if 'Using temporary' in extra:
+                masalah.append(f"temporary table pada {row.get('table')}")
+
+        if masalah:
+            temuan += 1
+            print(f"[!] {label}")
+            print(f"    {sql}")
+            for m in masalah:
+                print(f"    - {m}")
+            saran = suggest_index(sql)
+            if saran:
+                print(f"    saran: {saran}")
+        else:
+            keys = ', '.join(f"{row.get('table')}:{row.get('key') or '-'}" for row in plan or [])
+            print(f"[ok] {label} ({keys})")
+
+    for name in uncovered_methods():
+        print(f"[?] {name} belum punya contoh panggilan di MODEL_CALLS")
+    return temuan
+
+
+def seed(db, jumlah, chunk_size=1000):
+    """Isi produk dummy (kode diawali SEED-) per chunk untuk uji index."""
+    kategori = [row['id_kategori'] for row in db.fetchall("SELECT id_kategori FROM kategori") or []]
+    if not kategori:
+        raise MigrationError("Tabel kategori kosong, tidak bisa seed produk")
+    sql = """INSERT INTO produk (kode_produk, nama, harga, stok, kategori_id)
+             VALUES (%s, %s, %s, %s, %s)"""
+    for awal in range(0, jumlah, chunk_size):
+        rows = [(f"{SEED_PREFIX}{i:07d}", f"Produk Seed {(i * 7919) % jumlah:07d}", 1000 + i % 50000,
+                 i % 200, kategori[i % len(kategori)])
+                for i in range(awal, min(awal + chunk_size, jumlah))]
+        db.executemany(sql, rows)
+    db.fetchall("ANALYZE TABLE produk")
+
+
+def hapus_seed(db, chunk_size=1000):
+    total = 0
+    while True:
+        deleted = db.execute("DELETE FROM produk WHERE kode_produk LIKE %s LIMIT %s",
+                             (SEED_PREFIX + '%', chunk_size))
+        total += deleted
+        if not deleted:
+            break
+    db.fetchall("ANALYZE TABLE produk")
+    return total
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Migrasi skema & index advisor Toko Sembako')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    sub.add_parser('status', help='Tampilkan migrasi yang sudah/belum dijalankan')
+
+    up = sub.add_parser('up', help='Jalankan migrasi yang belum diterapkan')
+    up.add_argument('--target', help='Berhenti di versi ini')
+    up.add_argument('--chunk-size', type=int, default=1000)
+    up.add_argument('--pause', type=float, default=0.05, help='Jeda (detik) antar chunk backfill')
+    up.add_argument('--allow-lock', action='store_true',
+                    help='Izinkan ALTER TABLE dengan lock jika tidak bisa online')
+
+    adv = sub.add_parser('advise', help='EXPLAIN semua query di models.py')
+    adv.add_argument('--seed', type=int, default=0, help='Seed N produk dummy dulu, dihapus setelah selesai')
+    adv.add_argument('--keep-seed', action='store_true')
+    adv.add_argument('--min-rows', type=int, default=1000,
+                     help='Full scan di bawah jumlah baris ini tidak ditandai')
+
+    sd = sub.add_parser('seed', help='Tambah/hapus produk dummy untuk uji performa')
+    sd.add_argument('--produk', type=int, default=100000)
+    sd.add_argument('--hapus', action='store_true')
+
+    args = parser.parse_args(argv)
+    db = Database()
+
+    try:
+        if args.command == 'status':
+            migrator = Migrator(db)
+            applied = migrator.applied()
+            for version, nama, _ in migrator.available():
+                print(f"[{'x' if version in applied else ' '}] {version} {nama}")
+        elif args.command == 'up':
+            migrator = Migrator(db, chunk_size=args.chunk_size, pause=args.pause, allow_lock=args.allow_lock)
+            done = migrator.up(args.target)
+            print(f"{len(done)} migrasi dijalankan." if done else "Skema sudah terbaru.")
+        elif args.command == 'advise':
+            if args.seed:
+                print(f"Seed {args.seed} produk dummy...")
+                seed(db, args.seed)
+            try:
+                temuan = advise(db, args.min_rows)
+            finally:
+                if args.seed and not args.keep_seed:
+                    hapus_seed(db)
+            print(f"\n{temuan} query perlu diperiksa.")
+            return 1 if temuan else 0
+        elif args.command == 'seed':
+            if args.hapus:
+                print(f"{hapus_seed(db)} produk dummy dihapus.")
+            else:
+                seed(db, args.produk)
+                print(f"{args.produk} produk dummy ditambahkan.")
+    except MigrationError as e:
+        print(f"Error: {e}")
+        return 1
+    finally:
+        db.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,16 @@
+"""kode_produk unik untuk lookup barcode."""
+
+
+def up(m):
+    duplikat = m.fetchall("""SELECT kode_produk, COUNT(*) AS jumlah
+                             FROM produk
+                             GROUP BY kode_produk
+                             HAVING COUNT(*) > 1""")
+    if duplikat:
+        daftar = ', '.join(f"{row['kode_produk']} ({row['jumlah']}x)" for row in duplikat)
+        raise m.error(f"Kode produk duplikat harus diperbaiki dulu: {daftar}")
+
+    if not m.has_index('produk', 'uk_kode_produk'):
+        m.alter('produk', "ADD UNIQUE KEY `uk_kode_produk` (`kode_produk`)")
+    if m.has_index('produk', 'idx_kode_produk'):
+        m.alter('produk', "DROP KEY `idx_kode_produk`")
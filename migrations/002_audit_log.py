@@ -0,0 +1,18 @@
+"""Tabel audit_log untuk audit trail perubahan data admin."""
+
+
+def up(m):
+    m.execute("""CREATE TABLE IF NOT EXISTS `audit_log` (
+                   `id_audit` bigint(20) NOT NULL AUTO_INCREMENT,
+                   `id_user` int(11) DEFAULT NULL,
+                   `username` varchar(50) DEFAULT NULL,
+                   `aksi` varchar(10) NOT NULL,
+                   `tabel` varchar(25) NOT NULL,
+                   `id_record` int(11) DEFAULT NULL,
+                   `perubahan` text NOT NULL,
+                   `waktu` datetime NOT NULL,
+                   PRIMARY KEY (`id_audit`),
+                   KEY `idx_audit_tabel_record` (`tabel`,`id_record`),
+                   KEY `idx_audit_waktu` (`waktu`)
+                 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+                   COMMENT='Audit trail perubahan data'""")
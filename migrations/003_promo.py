@@ -0,0 +1,37 @@
+"""Tabel promo dan harga_efektif (harga hasil prekomputasi promo)."""
+
+
+def up(m):
+    m.execute("""CREATE TABLE IF NOT EXISTS `promo` (
+                   `id_promo` int(11) NOT NULL AUTO_INCREMENT,
+                   `nama_promo` varchar(100) NOT NULL,
+                   `tipe` varchar(10) NOT NULL COMMENT 'persen | potongan | harga',
+                   `nilai` int(11) NOT NULL,
+                   `min_qty` int(11) NOT NULL DEFAULT 1,
+                   `produk_id` int(11) DEFAULT NULL,
+                   `kategori_id` int(11) DEFAULT NULL,
+                   `mulai` datetime DEFAULT NULL,
+                   `selesai` datetime DEFAULT NULL,
+                   `aktif` tinyint(1) NOT NULL DEFAULT 1,
+                   PRIMARY KEY (`id_promo`),
+                   KEY `idx_promo_produk` (`produk_id`),
+                   KEY `idx_promo_kategori` (`kategori_id`),
+                   CONSTRAINT `fk_promo_produk` FOREIGN KEY (`produk_id`) REFERENCES `produk` (`id_produk`)
+                     ON DELETE CASCADE ON UPDATE CASCADE,
+                   CONSTRAINT `fk_promo_kategori` FOREIGN KEY (`kategori_id`) REFERENCES `kategori` (`id_kategori`)
+                     ON DELETE CASCADE ON UPDATE CASCADE
+                 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+                   COMMENT='Aturan promo, diskon dan harga grosir'""")
+    m.execute("""CREATE TABLE IF NOT EXISTS `harga_efektif` (
+                   `produk_id` int(11) NOT NULL,
+                   `min_qty` int(11) NOT NULL,
+                   `berlaku_mulai` datetime NOT NULL,
+                   `berlaku_sampai` datetime NOT NULL,
+                   `harga` int(11) NOT NULL,
+                   `harga_dasar` int(11) NOT NULL,
+                   `id_promo` int(11) DEFAULT NULL,
+                   PRIMARY KEY (`produk_id`,`min_qty`,`berlaku_mulai`),
+                   CONSTRAINT `fk_harga_efektif_produk` FOREIGN KEY (`produk_id`) REFERENCES `produk` (`id_produk`)
+                     ON DELETE CASCADE ON UPDATE CASCADE
+                 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+                   COMMENT='Harga hasil prekomputasi promo per produk, tier dan waktu'""")
@@ -0,0 +1,12 @@
+"""Index (kategori_id, nama) agar get_produk_by_kategori tidak perlu filesort.
+
+Index lama idx_kategori dihapus karena sudah tercakup oleh kolom pertama
+index baru (termasuk untuk foreign key fk_produk_kategori).
+"""
+
+
+def up(m):
+    if not m.has_index('produk', 'idx_kategori_nama'):
+        m.alter('produk', "ADD KEY `idx_kategori_nama` (`kategori_id`, `nama`)")
+    if m.has_index('produk', 'idx_kategori'):
+        m.alter('produk', "DROP KEY `idx_kategori`")
@@ -1,5 +1,15 @@
 
 import os
+import re
+import json
+import queue
+import sqlite3
+import atexit
+import logging
+import threading
+import time
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
 import pymysql
 import pymysql.err
 from werkzeug.security import generate_password_hash, check_password_hash
@@ -37,7 +47,7 @@ class Database:
             charset='utf8mb4',
             cursorclass=pymysql.cursors.DictCursor,
             autocommit=True,
-            connect_timeout=10
+            connect_timeout=int(os.getenv('DB_CONNECT_TIMEOUT', 10))
         )
 
     def execute(self, sql, params=None):
@@ -123,6 +133,96 @@ class Database:
                 except:
                     pass
 
+    def insert(self, sql, params=None):
+        """Seperti execute(), tetapi mengembalikan ID baris baru (lastrowid)."""
+        cur = None
+        try:
+            self._connect()
+            cur = self.connection.cursor()
+            cur.execute(sql, params)
+            self.connection.commit()
+            return cur.lastrowid
+        except (pymysql.err.OperationalError, pymysql.err.InterfaceError):
+            try:
+                self._connect()
+                if cur:
+                    try:
+                        cur.close()
+                    except:
+                        pass
+                cur = self.connection.cursor()
+                cur.execute(sql, params)
+                self.connection.commit()
+                return cur.lastrowid
+            except Exception:
+                raise
+        finally:
+            if cur:
+                try:
+                    cur.close()
+                except:
+                    pass
+
+    def executemany(self, sql, seq_params):
+        cur = None
+        try:
+            self._connect()
+            cur = self.connection.cursor()
+            cur.executemany(sql, seq_params)
+            self.connection.commit()
+            return cur.rowcount
+        except (pymysql.err.OperationalError, pymysql.err.InterfaceError):
+            try:
+                self._connect()
+                if cur:
+                    try:
+                        cur.close()
+                    except:
+                        pass
+                cur = self.connection.cursor()
+                cur.executemany(sql, seq_params)
+                self.connection.commit()
+                return cur.rowcount
+            except Exception:
+                raise
+        finally:
+            if cur:
+                try:
+                    cur.close()
+                except:
+                    pass
+
+    def transaction(self, statements):
+        """Jalankan beberapa (sql, seq_params) dengan executemany dalam satu transaksi.
+
+        Jika salah satu statement gagal, semua perubahan di-rollback.
+        """
+        try:
+            return self._transaction(statements)
+        except (pymysql.err.OperationalError, pymysql.err.InterfaceError):
+            # Koneksi putus di tengah transaksi berarti server sudah rollback; ulangi sekali
+            return self._transaction(statements)
+
+    def _transaction(self, statements):
+        self._connect()
+        cur = self.connection.cursor()
+        try:
+            self.connection.begin()
+            for sql, seq_params in statements:
+                cur.executemany(sql, seq_params)
+            self.connection.commit()
+        except Exception:
+            try:
+                self.connection.rollback()
+            except Exception:
+                pass
+            raise
+        finally:
+            try:
+                cur.close()
+            except:
+                pass
+
     def close(self):
         try:
             if self.connection:
@@ -133,7 +233,623 @@ class Database:
             self.connection = None
 
 
-db = Database()
+logger = logging.getLogger(__name__)
+
+
+class ReplicaDatabase(Database):
+    """Database dengan replika SQLite lokal untuk tabel produk & kategori.
+
+    Jika server MySQL tidak bisa dihubungi, query ke produk/kategori dilayani
+    dari replika dan write disimpan di antrean lokal (pending_writes). Saat
+    koneksi pulih, antrean dikirim ke primary per batch lalu replika disalin
+    ulang. Update stok dari antrean dikirim sebagai selisih (delta), bukan
+    nilai absolut, supaya penjualan di tempat lain tidak tertimpa.
+    """
+
+    TABLES = ('produk', 'kategori')
+    PRIMARY_KEYS = {'produk': 'id_produk', 'kategori': 'id_kategori'}
+    COLUMNS = {
+        'kategori': ('id_kategori', 'kode_kategori', 'nama_kategori', 'deskripsi', 'lokasi_rak'),
+        'produk': ('id_produk', 'kode_produk', 'nama', 'harga', 'stok', 'kategori_id'),
+    }
+    CONNECTION_ERRORS = (2002, 2003, 2006, 2013, 2055)
+    # Kolom yang bisa berisi ID lokal (dibuat saat offline) -> tabel asalnya.
+    # ID lokal selalu negatif sehingga tidak pernah sama dengan ID di primary.
+    ID_COLUMNS = {
+        'produk': {'id_produk': 'produk', 'kategori_id': 'kategori'},
+        'kategori': {'id_kategori': 'kategori'},
+    }
+    TABLE_RE = re.compile(r'\b(?:FROM|JOIN|INTO|UPDATE)\s+`?(\w+)', re.IGNORECASE)
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS kategori (
+            id_kategori INTEGER PRIMARY KEY,
+            kode_kategori TEXT NOT NULL UNIQUE,
+            nama_kategori TEXT NOT NULL COLLATE NOCASE,
+            deskripsi TEXT NOT NULL,
+            lokasi_rak TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS produk (
+            id_produk INTEGER PRIMARY KEY,
+            kode_produk TEXT NOT NULL UNIQUE,
+            nama TEXT NOT NULL COLLATE NOCASE,
+            harga INTEGER NOT NULL,
+            stok INTEGER NOT NULL DEFAULT 0,
+            kategori_id INTEGER NOT NULL
+                REFERENCES kategori (id_kategori) ON DELETE CASCADE ON UPDATE CASCADE
+        );
+        CREATE INDEX IF NOT EXISTS idx_kategori_nama ON produk (kategori_id, nama);
+        CREATE TABLE IF NOT EXISTS pending_writes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            tabel TEXT NOT NULL,
+            sql TEXT NOT NULL,
+            params TEXT NOT NULL,
+            local_id INTEGER,
+            error TEXT,
+            created_at TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS id_map (
+            tabel TEXT NOT NULL,
+            local_id INTEGER NOT NULL,
+            primary_id INTEGER NOT NULL,
+            PRIMARY KEY (tabel, local_id)
+        );
+    """
+
+    def __init__(self, path=None):
+        super().__init__()
+        self.path = path or os.getenv('REPLICA_PATH', 'replica.sqlite3')
+        self.local_reads = os.getenv('REPLICA_READS', '0') == '1'
+        self.retry_interval = float(os.getenv('REPLICA_RETRY_INTERVAL', 30))
+        self.sync_interval = float(os.getenv('REPLICA_SYNC_INTERVAL', 300))
+        self.batch_size = int(os.getenv('REPLICA_BATCH_SIZE', 100))
+        self.lock_timeout = float(os.getenv('REPLICA_LOCK_TIMEOUT', 5))
+        self.offline = False
+        self._offline_until = 0
+        self._synced_at = None
+        self._pending = None
+        self._affected = set()
+        self._local = None
+        self._lock = threading.RLock()
+
+    def _local_conn(self):
+        if self._local is None:
+            conn = sqlite3.connect(self.path, timeout=self.lock_timeout, isolation_level=None,
+                                   check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            conn.executescript(self.SCHEMA)
+            self._local = conn
+        return self._local
+
+    @classmethod
+    def _tables(cls, sql):
+        return {t.lower() for t in cls.TABLE_RE.findall(sql)}
+
+    def _replicated(self, sql):
+        tables = self._tables(sql)
+        return bool(tables) and tables <= set(self.TABLES)
+
+    @classmethod
+    def _is_connection_error(cls, e):
+        if isinstance(e, pymysql.err.InterfaceError):
+            return True
+        return bool(e.args) and e.args[0] in cls.CONNECTION_ERRORS
+
+    @staticmethod
+    def _param_index(sql, column):
+        """Posisi placeholder %s untuk kolom tertentu di INSERT/UPDATE/DELETE."""
+        m = re.search(r'\b%s\s*=\s*%%s' % column, sql)
+        if m:
+            return sql[:m.start()].count('%s')
+        m = re.search(r'\(([^)]*)\)\s*VALUES', sql, re.IGNORECASE)
+        if m:
+            columns = [c.strip(' `\n') for c in m.group(1).split(',')]
+            if column in columns:
+                return columns.index(column)
+        return None
+
+    def _mark_offline(self, e):
+        if not self.offline:
+            logger.warning('Server database tidak bisa dihubungi, beralih ke replika lokal: %s', e)
+        self.offline = True
+        self._offline_until = time.monotonic() + self.retry_interval
+
+    def _ensure_online(self):
+        """True jika primary bisa dipakai; antrean offline dikirim lebih dulu."""
+        if self.offline and time.monotonic() < self._offline_until:
+            return False
+        try:
+            if self._pending is None:
+                try:
+                    with self._lock:
+                        self._pending = self._local_conn().execute(
+                            "SELECT COUNT(*) FROM pending_writes WHERE error IS NULL").fetchone()[0] > 0
+                except sqlite3.Error as e:
+                    # Replika bermasalah (mis. terkunci): primary tetap dipakai, antrean dicek lagi nanti
+                    logger.warning('Antrean replika tidak bisa dibaca: %s', e)
+            if self.offline or self._pending:
+                self._connect()
+                self.reconcile()
+        except (pymysql.err.OperationalError, pymysql.err.InterfaceError) as e:
+            if not self._is_connection_error(e):
+                raise
+            self._mark_offline(e)
+            return False
+        except sqlite3.Error as e:
+            # Worker lain sedang mengirim antrean yang sama (replika terkunci). Request ini
+            # tetap memakai replika agar urutan write terjaga; reconcile dicoba lagi nanti.
+            logger.warning('Antrean replika belum bisa dikirim: %s', e)
+            self._pending = True
+            return False
+        if self.offline:
+            logger.info('Koneksi ke server database pulih')
+            self.offline = False
+        if self._affected:
+            self._after_reconcile()
+        return True
+
+    def _after_reconcile(self):
+        """Hitung ulang harga promo produk yang berubah selama offline."""
+        produk_ids, self._affected = sorted(self._affected), set()
+        try:
+            HargaEfektif.refresh(produk_ids=produk_ids)
+        except HargaEfektifError:
+            logger.exception('Harga promo %d produk hasil sinkronisasi tidak dihitung ulang', len(produk_ids))
+        produk_index.invalidate()
+
+    def _local_query(self, sql, params, one):
+        with self._lock:
+            cur = self._local_conn().execute(sql.replace('%s', '?'), tuple(params or ()))
+            if one:
+                row = cur.fetchone()
+                return dict(row) if row else None
+            return [dict(row) for row in cur.fetchall()]
+
+    def _read(self, sql, params, one):
+        if self._ensure_online():
+            try:
+                # Replika tetap disegarkan selama online agar siap dipakai saat offline
+                self._sync_if_stale()
+                if self.local_reads:
+                    try:
+                        return self._local_query(sql, params, one)
+                    except sqlite3.Error as e:
+                        logger.warning('Replika lokal tidak bisa dibaca, memakai server: %s', e)
+                if one:
+                    return super().fetchone(sql, params)
+                return super().fetchall(sql, params)
+            except (pymysql.err.OperationalError, pymysql.err.InterfaceError) as e:
+                if not self._is_connection_error(e):
+                    raise
+                self._mark_offline(e)
+        return self._local_query(sql, params, one)
+
+    def _primary(self, method, *args):
+        """Query ke tabel yang tidak direplikasi, langsung gagal selama server offline."""
+        if self.offline and time.monotonic() < self._offline_until:
+            raise pymysql.err.OperationalError(2003, 'Server database offline, tabel ini tidak ada di replika')
+        try:
+            return method(*args)
+        except (pymysql.err.OperationalError, pymysql.err.InterfaceError) as e:
+            if self._is_connection_error(e):
+                self._mark_offline(e)
+            raise
+
+    def fetchone(self, sql, params=None):
+        if not self._replicated(sql):
+            return self._primary(super().fetchone, sql, params)
+        return self._read(sql, params, one=True)
+
+    def fetchall(self, sql, params=None):
+        if not self._replicated(sql):
+            return self._primary(super().fetchall, sql, params)
+        return self._read(sql, params, one=False)
+
+    def execute(self, sql, params=None):
+        if not self._replicated(sql):
+            return self._primary(super().execute, sql, params)
+        return self._write(sql, params, insert=False)
+
+    def insert(self, sql, params=None):
+        if not self._replicated(sql):
+            return self._primary(super().insert, sql, params)
+        return self._write(sql, params, insert=True)
+
+    def executemany(self, sql, seq_params):
+        return self._primary(super().executemany, sql, seq_params)
+
+    def transaction(self, statements):
+        return self._primary(super().transaction, statements)
+
+    def _write(self, sql, params, insert):
+        if self._ensure_online():
+            try:
+                if insert:
+                    result = super().insert(sql, params)
+                else:
+                    result = super().execute(sql, params)
+            except (pymysql.err.OperationalError, pymysql.err.InterfaceError) as e:
+                if not self._is_connection_error(e):
+                    raise
+                self._mark_offline(e)
+            else:
+                self._mirror(sql, params, result if insert else None)
+                return result
+        rowcount, lastrowid = self._queue_write(sql, params)
+        return lastrowid if insert else rowcount
+
+    def _mirror(self, sql, params, lastrowid):
+        """Salin baris yang baru ditulis ke primary ke replika, tanpa sync penuh."""
+        tabel = self._tables(sql).pop()
+        pk = self.PRIMARY_KEYS[tabel]
+        if lastrowid is not None:
+            id_row = lastrowid
+        else:
+            idx = self._param_index(sql, pk)
+            id_row = list(params or ())[idx] if idx is not None else None
+        try:
+            if id_row is None:
+                raise ValueError('baris yang ditulis tidak diketahui')
+            columns = self.COLUMNS[tabel]
+            row = Database.fetchone(self, "SELECT %s FROM %s WHERE %s = %%s" % (', '.join(columns), tabel, pk),
+                                    (id_row,))
+            with self._lock:
+                conn = self._local_conn()
+                if row is None:
+                    conn.execute("DELETE FROM %s WHERE %s = ?" % (tabel, pk), (id_row,))
+                else:
+                    conn.execute(
+                        "INSERT INTO %s (%s) VALUES (%s) ON CONFLICT (%s) DO UPDATE SET %s" % (
+                            tabel, ', '.join(columns), ', '.join(['?'] * len(columns)), pk,
+                            ', '.join('%s = excluded.%s' % (c, c) for c in columns[1:])),
+                        tuple(row[c] for c in columns))
+        except (sqlite3.Error, pymysql.err.MySQLError, ValueError) as e:
+            # Write di primary sudah berhasil; replika cukup disalin ulang saat sync berikutnya
+            logger.warning('Replika tidak bisa diperbarui setelah write: %s', e)
+            self._synced_at = None
+
+    def _queue_write(self, sql, params):
+        params = list(params or ())
+        tabel = self._tables(sql).pop()
+        replay_sql, replay_params = sql, list(params)
+        is_insert = sql.lstrip().upper().startswith('INSERT')
+
+        with self._lock:
+            conn = self._local_conn()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                stok_idx = self._param_index(sql, 'stok')
+                id_idx = self._param_index(sql, 'id_produk')
+                if tabel == 'produk' and not is_insert and stok_idx is not None and id_idx is not None:
+                    row = conn.execute("SELECT stok FROM produk WHERE id_produk = ?",
+                                       (params[id_idx],)).fetchone()
+                    if row is not None:
+                        replay_sql = re.sub(r'\bstok\s*=\s*%s', 'stok = GREATEST(stok + %s, 0)', sql, count=1)
+                        replay_params[stok_idx] = int(params[stok_idx]) - row['stok']
+
+                cur = conn.execute(sql.replace('%s', '?'), tuple(params))
+                rowcount, local_id = cur.rowcount, None
+                if is_insert:
+                    local_id = self._local_id(conn, tabel)
+                    conn.execute("UPDATE %s SET %s = ? WHERE rowid = ?" % (tabel, self.PRIMARY_KEYS[tabel]),
+                                 (local_id, cur.lastrowid))
+                conn.execute(
+                    """INSERT INTO pending_writes (tabel, sql, params, local_id, created_at)
+                       VALUES (?, ?, ?, ?, ?)""",
+                    (tabel, replay_sql, json.dumps(replay_params, default=str),
+                     local_id, datetime.now().isoformat())
+                )
+                conn.execute("COMMIT")
+            except sqlite3.IntegrityError as e:
+                conn.execute("ROLLBACK")
+                # Samakan kode error dengan MySQL: 1062 duplikat, 1452 foreign key
+                code = 1062 if 'UNIQUE' in str(e) else 1452 if 'FOREIGN KEY' in str(e) else 1048
+                raise pymysql.err.IntegrityError(code, str(e))
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        self._pending = True
+        return rowcount, local_id
+
+    def _local_id(self, conn, tabel):
+        """ID negatif berikutnya untuk baris yang dibuat saat offline."""
+        terkecil = conn.execute("SELECT MIN(%s) FROM %s" % (self.PRIMARY_KEYS[tabel], tabel)).fetchone()[0]
+        antrean = conn.execute("SELECT MIN(local_id) FROM pending_writes WHERE tabel = ?", (tabel,)).fetchone()[0]
+        return min(terkecil or 0, antrean or 0, 0) - 1
+
+    def reconcile(self):
+        """Kirim antrean write offline ke primary per batch.
+
+        Setiap batch dijalankan dalam satu transaksi; write yang ditolak
+        primary (mis. kode duplikat) dilewati lewat savepoint dan ditandai
+        error di pending_writes tanpa menggagalkan batch. Write yang memakai
+        ID lokal dari INSERT yang gagal ikut ditandai error dan tidak pernah
+        dikirim ke primary.
+        """
+        applied = 0
+        with self._lock:
+            conn = self._local_conn()
+            while True:
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    rows = conn.execute(
+                        "SELECT * FROM pending_writes WHERE error IS NULL ORDER BY id LIMIT ?",
+                        (self.batch_size,)).fetchall()
+                    if not rows:
+                        # Antrean sudah habis, pemetaan ID lokal tidak diperlukan lagi
+                        conn.execute("DELETE FROM id_map")
+                        conn.execute("COMMIT")
+                        break
+                    id_map = {}
+                    for m in conn.execute("SELECT tabel, local_id, primary_id FROM id_map"):
+                        id_map.setdefault(m['tabel'], {})[m['local_id']] = m['primary_id']
+
+                    self._connect()
+                    self.connection.begin()
+                    done, failed, affected = [], [], set()
+                    with self.connection.cursor() as cur:
+                        for row in rows:
+                            params, error = self._remap(row, id_map)
+                            if error:
+                                failed.append((error, row['id']))
+                                continue
+                            cur.execute("SAVEPOINT pending_write")
+                            try:
+                                cur.execute(row['sql'], params)
+                            except (pymysql.err.IntegrityError, pymysql.err.ProgrammingError,
+                                    pymysql.err.DataError) as e:
+                                cur.execute("ROLLBACK TO SAVEPOINT pending_write")
+                                failed.append((str(e), row['id']))
+                                continue
+                            if row['local_id'] is not None:
+                                id_map.setdefault(row['tabel'], {})[row['local_id']] = cur.lastrowid
+                                conn.execute("INSERT OR REPLACE INTO id_map VALUES (?, ?, ?)",
+                                             (row['tabel'], row['local_id'], cur.lastrowid))
+                            if row['tabel'] == 'produk':
+                                idx = self._param_index(row['sql'], 'id_produk')
+                                if row['local_id'] is not None:
+                                    affected.add(cur.lastrowid)
+                                elif idx is not None:
+                                    affected.add(params[idx])
+                            done.append((row['id'],))
+                    self.connection.commit()
+                except Exception:
+                    conn.execute("ROLLBACK")
+                    try:
+                        self.connection.rollback()
+                    except Exception:
+                        pass
+                    raise
+                conn.executemany("DELETE FROM pending_writes WHERE id = ?", done)
+                conn.executemany("UPDATE pending_writes SET error = ? WHERE id = ?", failed)
+                conn.execute("COMMIT")
+                applied += len(done)
+                self._affected |= affected
+                for error, pending_id in failed:
+                    logger.warning('Write offline #%s ditolak server: %s', pending_id, error)
+            if applied:
+                logger.info('%d write offline berhasil disinkronkan', applied)
+        self._pending = False
+        self._synced_at = None
+        return applied
+
+    def _remap(self, row, id_map):
+        """Ganti ID lokal (negatif) di parameter write dengan ID dari primary.
+
+        Mengembalikan (params, error); error terisi jika ada ID lokal yang
+        tidak punya pasangan, yaitu INSERT asalnya gagal dikirim.
+        """
+        params = json.loads(row['params'])
+        for column, target in self.ID_COLUMNS.get(row['tabel'], {}).items():
+            idx = self._param_index(row['sql'], column)
+            if idx is None or not isinstance(params[idx], int) or params[idx] >= 0:
+                continue
+            if params[idx] not in id_map.get(target, {}):
+                return params, '%s %s dibuat offline dan gagal dikirim ke server' % (target, params[idx])
+            params[idx] = id_map[target][params[idx]]
+        return params, None
+
+    def _sync_if_stale(self):
+        if self._synced_at is None or time.monotonic() - self._synced_at > self.sync_interval:
+            try:
+                self.sync()
+            except sqlite3.Error as e:
+                # Jangan ulangi di setiap request; coba lagi setelah sync_interval
+                logger.warning('Replika lokal tidak bisa disinkronkan: %s', e)
+                self._synced_at = time.monotonic()
+
+    def sync(self):
+        """Salin ulang produk & kategori dari primary ke replika lokal."""
+        with self._lock:
+            ada_antrean = self._local_conn().execute(
+                "SELECT COUNT(*) FROM pending_writes WHERE error IS NULL").fetchone()[0]
+        if ada_antrean:
+            self._skip_sync()
+            return
+        kategori = Database.fetchall(self, "SELECT %s FROM kategori" % ', '.join(self.COLUMNS['kategori']))
+        produk = Database.fetchall(self, "SELECT %s FROM produk" % ', '.join(self.COLUMNS['produk']))
+        with self._lock:
+            conn = self._local_conn()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if conn.execute("SELECT COUNT(*) FROM pending_writes WHERE error IS NULL").fetchone()[0]:
+                    conn.execute("ROLLBACK")
+                    self._skip_sync()
+                    return
+                conn.execute("DELETE FROM produk")
+                conn.execute("DELETE FROM kategori")
+                for tabel, rows in (('kategori', kategori), ('produk', produk)):
+                    columns = self.COLUMNS[tabel]
+                    conn.executemany(
+                        "INSERT INTO %s (%s) VALUES (%s)" % (tabel, ', '.join(columns), ', '.join(['?'] * len(columns))),
+                        [tuple(r[c] for c in columns) for r in rows or []])
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        self._synced_at = time.monotonic()
+
+    def _skip_sync(self):
+        # Jangan timpa perubahan offline yang belum terkirim (bisa dari worker lain yang
+        # memakai file replika yang sama). Antrean dikirim dulu lewat _ensure_online,
+        # setelah itu reconcile() meminta sync ulang.
+        self._pending = True
+        self._synced_at = time.monotonic()
+
+
+db = ReplicaDatabase() if os.getenv('REPLICA_PATH') else Database()
+
+
+class ProdukIndex:
+    """Index in-memory kode_produk -> baris produk untuk lookup barcode.
+
+    Kode yang tidak ditemukan ikut diingat sampai TTL habis, dan kode yang
+    belum ada di index diambil dalam satu query. Setelah TTL habis index
+    dimuat ulang di thread background; request tetap dilayani dari data lama.
+    """
+
+    def __init__(self, ttl=None):
+        self.ttl = ttl if ttl is not None else int(os.getenv('PRODUK_INDEX_TTL', 60))
+        self._lock = threading.Lock()
+        self._by_kode = {}
+        self._kode_by_id = {}
+        self._missing = {}
+        self._loaded_at = None
+        self._stale = False
+        self._reloading = False
+        self._db = None
+
+    def _load(self, database=None):
+        database = database or db
+        rows = database.fetchall(Produk.SELECT_SQL + " ORDER BY p.id_produk")
+        tier_map = self._tier_map(database=database)
+        by_kode = {}
+        kode_by_id = {}
+        for row in rows or []:
+            row = self._with_tier(row, tier_map)
+            by_kode[row['kode_produk']] = row
+            kode_by_id[row['id_produk']] = row['kode_produk']
+        with self._lock:
+            self._by_kode = by_kode
+            self._kode_by_id = kode_by_id
+            self._missing = {}
+            self._loaded_at = time.monotonic()
+
+    def _ensure_loaded(self):
+        # Worker gunicorn lain tidak memanggil hook di proses ini,
+        # jadi index dimuat ulang penuh setelah TTL habis.
+        loaded_at = self._loaded_at
+        if loaded_at is None:
+            self._load()
+        elif self._stale or time.monotonic() - loaded_at > self.ttl:
+            self._reload_background()
+
+    def _reload_background(self):
+        with self._lock:
+            if self._reloading:
+                return
+            self._reloading = True
+            self._stale = False
+        threading.Thread(target=self._reload, name='produk-index', daemon=True).start()
+
+    def _reload(self):
+        try:
+            if getattr(db, 'offline', False):
+                # Data lama dipakai terus; kode yang belum ada dicari di replika
+                return
+            # Koneksi sendiri: koneksi pymysql tidak boleh dipakai dua thread sekaligus
+            if self._db is None:
+                self._db = Database()
+            self._load(self._db)
+        except Exception:
+            logger.exception('Index produk gagal dimuat ulang')
+        finally:
+            with self._lock:
+                self._reloading = False
+
+    def get(self, kode_produk):
+        return self.get_many([kode_produk]).get(kode_produk)
+
+    def get_many(self, kode_list):
+        self._ensure_loaded()
+        sekarang = time.monotonic()
+        result = {}
+        misses = []
+        for kode in kode_list:
+            row = self._by_kode.get(kode)
+            if row is not None:
+                result[kode] = row
+            elif self._missing.get(kode, 0) <= sekarang and kode not in misses:
+                misses.append(kode)
+        if misses:
+            result.update(self._fetch(misses))
+        return result
+
+    def refresh(self, kode_produk):
+        """Sinkronkan satu kode dari database ke index."""
+        return self._fetch([kode_produk]).get(kode_produk)
+
+    def _fetch(self, kode_list):
+        """Ambil beberapa kode dalam satu query dan simpan hasilnya (termasuk yang tidak ada)."""
+        rows = db.fetchall(Produk.SELECT_SQL + " WHERE p.kode_produk IN (%s)" % ', '.join(['%s'] * len(kode_list)),
+                           tuple(kode_list))
+        rows = list(rows or [])
+        tier_map = self._tier_map([row['id_produk'] for row in rows]) if rows else {}
+        # Collation MySQL tidak membedakan huruf besar/kecil
+        by_lower = {row['kode_produk'].lower(): self._with_tier(row, tier_map) for row in rows}
+        result = {}
+        kadaluarsa = time.monotonic() + self.ttl
+        with self._lock:
+            for row in by_lower.values():
+                old_kode = self._kode_by_id.get(row['id_produk'])
+                if old_kode is not None and old_kode != row['kode_produk']:
+                    self._by_kode.pop(old_kode, None)
+                self._by_kode[row['kode_produk']] = row
+                self._kode_by_id[row['id_produk']] = row['kode_produk']
+                self._missing.pop(row['kode_produk'], None)
+            for kode in kode_list:
+                row = by_lower.get(kode.lower())
+                if row is not None:
+                    result[kode] = row
+                    self._missing.pop(kode, None)
+                else:
+                    self._by_kode.pop(kode, None)
+                    self._missing[kode] = kadaluarsa
+            if self._reloading:
+                # Hasil reload yang sedang berjalan bisa lebih lama dari perubahan ini
+                self._stale = True
+        return result
+
+    @staticmethod
+    def _tier_map(produk_ids=None, database=None):
+        try:
+            return HargaEfektif.get_tier_map(produk_ids, database=database)
+        except Exception:
+            logger.exception('Harga promo tidak bisa dimuat ke index produk')
+            return {}
+
+    @staticmethod
+    def _with_tier(row, tier_map):
+        # Tier ikut disimpan di index agar scan barcode tidak perlu query harga_efektif.
+        # Promo yang mulai/berakhir terbaca paling lambat setelah TTL index habis.
+        return dict(row, harga_tier=tier_map.get(row['id_produk']) or [{'min_qty': 1, 'harga': row['harga']}])
+
+    def discard_id(self, id_produk):
+        with self._lock:
+            kode = self._kode_by_id.pop(id_produk, None)
+            if kode is not None:
+                self._by_kode.pop(kode, None)
+            if self._reloading:
+                self._stale = True
+
+    def invalidate(self):
+        """Tandai index basi; dimuat ulang di background pada lookup berikutnya."""
+        with self._lock:
+            self._stale = True
+
+
+produk_index = ProdukIndex()
 
 
 class User:
@@ -142,7 +858,7 @@ class User:
     def create_user(username, password, role='kasir'):
         hashed_password = generate_password_hash(password)
         sql = "INSERT INTO users (username, password, role) VALUES (%s, %s, %s)"
-        db.execute(sql, (username, hashed_password, role))
+        return db.insert(sql, (username, hashed_password, role))
 
     @staticmethod
     def check_login(username, password):
@@ -180,37 +896,44 @@ class User:
 
 class Produk:
 
+    SELECT_SQL = """SELECT p.id_produk, p.kode_produk, p.nama, p.harga, p.stok, p.kategori_id,
+                        k.nama_kategori, k.lokasi_rak
+                 FROM produk p
+                 LEFT JOIN kategori k ON p.kategori_id = k.id_kategori"""
+
     @staticmethod
     def create_produk(kode_produk, nama, harga, stok, kategori_id):
         sql = """INSERT INTO produk (kode_produk, nama, harga, stok, kategori_id)
                  VALUES (%s, %s, %s, %s, %s)"""
-        db.execute(sql, (kode_produk, nama, harga, stok, kategori_id))
+        id_produk = db.insert(sql, (kode_produk, nama, harga, stok, kategori_id))
+        Produk._refresh_harga(kode_produk=kode_produk)
+        produk_index.refresh(kode_produk)
+        return id_produk
 
     @staticmethod
     def get_produk_by_id(id_produk):
-        sql = """SELECT p.id_produk, p.kode_produk, p.nama, p.harga, p.stok, p.kategori_id,
-                        k.nama_kategori, k.lokasi_rak
-                 FROM produk p
-                 LEFT JOIN kategori k ON p.kategori_id = k.id_kategori
-                 WHERE p.id_produk = %s"""
+        sql = Produk.SELECT_SQL + " WHERE p.id_produk = %s"
         return db.fetchone(sql, (id_produk,))
 
+    @staticmethod
+    def get_produk_by_kode(kode_produk):
+        """Lookup barcode lewat index in-memory, fallback ke database."""
+        return produk_index.get(kode_produk)
+
+    @staticmethod
+    def get_produk_by_kode_list(kode_list):
+        """Lookup banyak barcode sekaligus, hasil berupa dict kode -> produk."""
+        return produk_index.get_many(kode_list)
+
     @staticmethod
     def get_all_produk():
-        sql = """SELECT p.id_produk, p.kode_produk, p.nama, p.harga, p.stok, p.kategori_id,
-                        k.nama_kategori, k.lokasi_rak
-                 FROM produk p
-                 LEFT JOIN kategori k ON p.kategori_id = k.id_kategori
-                 ORDER BY p.id_produk"""
+        sql = Produk.SELECT_SQL + " ORDER BY p.id_produk"
         return db.fetchall(sql)
 
     @staticmethod
     def get_produk_terbaru(limit=5):
         """Ambil produk terbaru berdasarkan ID (terbesar = terbaru)."""
-        sql = """SELECT p.id_produk, p.kode_produk, p.nama, p.harga, p.stok, p.kategori_id,
-                        k.nama_kategori, k.lokasi_rak
-                 FROM produk p
-                 LEFT JOIN kategori k ON p.kategori_id = k.id_kategori
+        sql = Produk.SELECT_SQL + """
                  ORDER BY p.id_produk DESC
                  LIMIT %s"""
         return db.fetchall(sql, (limit,))
@@ -219,6 +942,7 @@ class Produk:
     def delete_produk(id_produk):
         sql = "DELETE FROM produk WHERE id_produk = %s"
         db.execute(sql, (id_produk,))
+        produk_index.discard_id(id_produk)
 
     @staticmethod
     def update_produk(id_produk, kode_produk, nama, harga, stok, kategori_id):
@@ -226,6 +950,17 @@ class Produk:
                  SET kode_produk = %s, nama = %s, harga = %s, stok = %s, kategori_id = %s
                  WHERE id_produk = %s"""
         db.execute(sql, (kode_produk, nama, harga, stok, kategori_id, id_produk))
+        Produk._refresh_harga(id_produk=id_produk)
+        produk_index.discard_id(id_produk)
+        produk_index.refresh(kode_produk)
+
+    @staticmethod
+    def _refresh_harga(**kwargs):
+        try:
+            HargaEfektif.refresh(**kwargs)
+        except HargaEfektifError:
+            # Produk sudah tersimpan; baris harga lama diabaikan lewat harga_dasar
+            logger.exception('Harga promo produk %s tidak dihitung ulang', kwargs)
 
     @staticmethod
     def get_produk_by_kategori(kategori_id):
@@ -239,7 +974,7 @@ class Kategori:
     def create_kategori(kode_kategori, nama_kategori, deskripsi, lokasi_rak):
         sql = """INSERT INTO kategori (kode_kategori, nama_kategori, deskripsi, lokasi_rak)
                  VALUES (%s, %s, %s, %s)"""
-        db.execute(sql, (kode_kategori, nama_kategori, deskripsi, lokasi_rak))
+        return db.insert(sql, (kode_kategori, nama_kategori, deskripsi, lokasi_rak))
 
     @staticmethod
     def get_kategori_by_id(id_kategori):
@@ -255,10 +990,366 @@ class Kategori:
     def delete_kategori(id_kategori):
         sql = "DELETE FROM kategori WHERE id_kategori = %s"
         db.execute(sql, (id_kategori,))
+        # Produk terkait ikut terhapus (ON DELETE CASCADE)
+        produk_index.invalidate()
 
     @staticmethod
     def update_kategori(id_kategori, kode_kategori, nama_kategori, deskripsi, lokasi_rak):
         sql = """UPDATE kategori
                  SET kode_kategori = %s, nama_kategori = %s, deskripsi = %s, lokasi_rak = %s
                  WHERE id_kategori = %s"""
-        db.execute(sql, (kode_kategori, nama_kategori, deskripsi, lokasi_rak, id_kategori))
\ No newline at end of file
+        db.execute(sql, (kode_kategori, nama_kategori, deskripsi, lokasi_rak, id_kategori))
+        # nama_kategori & lokasi_rak ikut tersimpan di index produk
+        produk_index.invalidate()
+
+
+class Promo:
+
+    TIPE = ('persen', 'potongan', 'harga')
+
+    @staticmethod
+    def create_promo(nama_promo, tipe, nilai, min_qty=1, produk_id=None, kategori_id=None,
+                     mulai=None, selesai=None, aktif=True):
+        sql = """INSERT INTO promo (nama_promo, tipe, nilai, min_qty, produk_id, kategori_id, mulai, selesai, aktif)
+                 VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)"""
+        id_promo = db.insert(sql, (nama_promo, tipe, nilai, min_qty, produk_id, kategori_id, mulai, selesai,
+                                   int(aktif)))
+        try:
+            HargaEfektif.refresh(id_produk=produk_id, kategori_id=kategori_id)
+        except HargaEfektifError as e:
+            e.id_record = id_promo
+            raise
+        finally:
+            produk_index.invalidate()
+        return id_promo
+
+    @staticmethod
+    def get_promo_by_id(id_promo):
+        sql = "SELECT * FROM promo WHERE id_promo = %s"
+        return db.fetchone(sql, (id_promo,))
+
+    @staticmethod
+    def get_all_promo():
+        sql = """SELECT pr.*, p.nama, k.nama_kategori
+                 FROM promo pr
+                 LEFT JOIN produk p ON pr.produk_id = p.id_produk
+                 LEFT JOIN kategori k ON pr.kategori_id = k.id_kategori
+                 ORDER BY pr.id_promo"""
+        return db.fetchall(sql)
+
+    @staticmethod
+    def update_promo(id_promo, nama_promo, tipe, nilai, min_qty=1, produk_id=None, kategori_id=None,
+                     mulai=None, selesai=None, aktif=True):
+        lama = Promo.get_promo_by_id(id_promo)
+        sql = """UPDATE promo
+                 SET nama_promo = %s, tipe = %s, nilai = %s, min_qty = %s, produk_id = %s,
+                     kategori_id = %s, mulai = %s, selesai = %s, aktif = %s
+                 WHERE id_promo = %s"""
+        db.execute(sql, (nama_promo, tipe, nilai, min_qty, produk_id, kategori_id, mulai, selesai,
+                         int(aktif), id_promo))
+        try:
+            if lama and (lama['produk_id'], lama['kategori_id']) != (produk_id, kategori_id):
+                HargaEfektif.refresh(id_produk=lama['produk_id'], kategori_id=lama['kategori_id'])
+            HargaEfektif.refresh(id_produk=produk_id, kategori_id=kategori_id)
+        finally:
+            produk_index.invalidate()
+
+    @staticmethod
+    def delete_promo(id_promo):
+        lama = Promo.get_promo_by_id(id_promo)
+        sql = "DELETE FROM promo WHERE id_promo = %s"
+        db.execute(sql, (id_promo,))
+        if lama:
+            try:
+                HargaEfektif.refresh(id_produk=lama['produk_id'], kategori_id=lama['kategori_id'])
+            finally:
+                produk_index.invalidate()
+
+
+class HargaEfektifError(Exception):
+    """Data sudah tersimpan, tetapi harga_efektif gagal dihitung ulang."""
+
+    id_record = None
+
+
+class HargaEfektif:
+    """Tabel harga hasil prekomputasi aturan promo.
+
+    Untuk setiap produk, tier (min_qty) dan rentang waktu, tabel
+    harga_efektif menyimpan harga terbaik yang berlaku, sehingga harga di
+    kasir dan daftar produk cukup dibaca dengan satu query ber-index.
+    Tabel diperbarui hanya untuk produk yang terdampak saat produk atau
+    promo berubah. Baris yang harga_dasar-nya tidak sama dengan produk.harga
+    dianggap basi dan diabaikan (harga normal yang dipakai).
+    """
+
+    AWAL = datetime(1000, 1, 1)
+    AKHIR = datetime(9999, 12, 31)
+    CHUNK = 500
+
+    @staticmethod
+    def hitung(harga, promo):
+        if promo['tipe'] == 'persen':
+            harga = harga - harga * promo['nilai'] // 100
+        elif promo['tipe'] == 'potongan':
+            harga = harga - promo['nilai']
+        else:
+            harga = promo['nilai']
+        return max(harga, 0)
+
+    @classmethod
+    def build_rows(cls, produk, promo_list, sekarang):
+        """Susun baris harga_efektif untuk satu produk."""
+        berlaku = [pr for pr in promo_list
+                   if pr['produk_id'] in (None, produk['id_produk'])
+                   and pr['kategori_id'] in (None, produk['kategori_id'])]
+        tiers = sorted({1} | {pr['min_qty'] for pr in berlaku})
+        batas = sorted({cls.AWAL, cls.AKHIR}
+                       | {pr['mulai'] for pr in berlaku if pr['mulai']}
+                       | {pr['selesai'] for pr in berlaku if pr['selesai']})
+
+        rows = []
+        for tier in tiers:
+            sebelumnya = None
+            for mulai, sampai in zip(batas, batas[1:]):
+                if sampai <= sekarang:
+                    continue
+                harga, id_promo = produk['harga'], None
+                for pr in berlaku:
+                    if pr['min_qty'] > tier:
+                        continue
+                    if (pr['mulai'] or cls.AWAL) > mulai or (pr['selesai'] or cls.AKHIR) < sampai:
+                        continue
+                    harga_promo = cls.hitung(produk['harga'], pr)
+                    if harga_promo < harga:
+                        harga, id_promo = harga_promo, pr['id_promo']
+                if sebelumnya and sebelumnya[4] == harga and sebelumnya[6] == id_promo:
+                    sebelumnya[3] = sampai
+                    continue
+                sebelumnya = [produk['id_produk'], tier, mulai, sampai, harga, produk['harga'], id_promo]
+                rows.append(sebelumnya)
+        return [tuple(row) for row in rows]
+
+    @classmethod
+    def refresh(cls, id_produk=None, kode_produk=None, kategori_id=None, produk_ids=None):
+        """Hitung ulang harga_efektif untuk produk yang terdampak.
+
+        Tanpa argumen, semua produk dihitung ulang. Setiap chunk (DELETE lalu
+        INSERT) dijalankan dalam satu transaksi; kegagalan dilempar sebagai
+        HargaEfektifError.
+        """
+        if getattr(db, 'offline', False):
+            # Tabel promo tidak direplikasi; baris basi diabaikan lewat harga_dasar
+            return
+        if id_produk is not None:
+            where, params = "id_produk = %s", (id_produk,)
+        elif kode_produk is not None:
+            where, params = "kode_produk = %s", (kode_produk,)
+        elif kategori_id is not None:
+            where, params = "kategori_id = %s", (kategori_id,)
+        elif produk_ids is not None:
+            if not produk_ids:
+                return
+            where, params = "id_produk IN (%s)" % ', '.join(['%s'] * len(produk_ids)), tuple(produk_ids)
+        else:
+            where, params = "1 = 1", ()
+
+        try:
+            produk_list = db.fetchall(
+                "SELECT id_produk, harga, kategori_id FROM produk WHERE " + where, params)
+            sekarang = datetime.now()
+            promo_list = db.fetchall(
+                """SELECT id_promo, tipe, nilai, min_qty, produk_id, kategori_id, mulai, selesai
+                   FROM promo
+                   WHERE aktif = 1 AND (selesai IS NULL OR selesai > %s)""", (sekarang,))
+            produk_list = list(produk_list or [])
+            for i in range(0, len(produk_list), cls.CHUNK):
+                chunk = produk_list[i:i + cls.CHUNK]
+                rows = []
+                for produk in chunk:
+                    rows.extend(cls.build_rows(produk, promo_list or [], sekarang))
+                ids = [produk['id_produk'] for produk in chunk]
+                statements = [("DELETE FROM harga_efektif WHERE produk_id IN (%s)" % ', '.join(['%s'] * len(ids)),
+                               [ids])]
+                if rows:
+                    statements.append(("""INSERT INTO harga_efektif
+                                         (produk_id, min_qty, berlaku_mulai, berlaku_sampai, harga, harga_dasar,
+                                          id_promo)
+                                         VALUES (%s, %s, %s, %s, %s, %s, %s)""", rows))
+                db.transaction(statements)
+        except Exception as e:
+            raise HargaEfektifError('Gagal memperbarui tabel harga efektif: %s' % e) from e
+
+    @staticmethod
+    def get_harga(id_produk, qty=1, waktu=None):
+        """Harga satuan yang berlaku untuk pembelian qty item pada waktu tertentu."""
+        sql = """SELECT p.harga AS harga_dasar, h.harga
+                 FROM produk p
+                 LEFT JOIN harga_efektif h
+                        ON h.produk_id = p.id_produk AND h.harga_dasar = p.harga
+                       AND h.min_qty <= %s AND h.berlaku_mulai <= %s AND h.berlaku_sampai > %s
+                 WHERE p.id_produk = %s
+                 ORDER BY h.min_qty DESC
+                 LIMIT 1"""
+        waktu = waktu or datetime.now()
+        row = db.fetchone(sql, (qty, waktu, waktu, id_produk))
+        if not row:
+            return None
+        return row['harga'] if row['harga'] is not None else row['harga_dasar']
+
+    @staticmethod
+    def get_tier_map(produk_ids=None, waktu=None, database=None):
+        """Tier harga yang berlaku sekarang: {id_produk: [{'min_qty', 'harga'}, ...]}.
+
+        database dipakai untuk query dari thread lain (default: db).
+        """
+        if getattr(db, 'offline', False):
+            # harga_efektif tidak direplikasi; saat offline kasir memakai harga dasar
+            return {}
+        sql = """SELECT h.produk_id, h.min_qty, h.harga
+                 FROM harga_efektif h
+                 JOIN produk p ON p.id_produk = h.produk_id AND p.harga = h.harga_dasar
+                 WHERE h.berlaku_mulai <= %s AND h.berlaku_sampai > %s"""
+        waktu = waktu or datetime.now()
+        params = [waktu, waktu]
+        if produk_ids is not None:
+            if not produk_ids:
+                return {}
+            sql += " AND h.produk_id IN (%s)" % ', '.join(['%s'] * len(produk_ids))
+            params.extend(produk_ids)
+        sql += " ORDER BY h.produk_id, h.min_qty"
+        tier_map = {}
+        for row in (database or db).fetchall(sql, params) or []:
+            tier_map.setdefault(row['produk_id'], []).append(
+                {'min_qty': row['min_qty'], 'harga': row['harga']})
+        return tier_map
+
+
+class AuditLog:
+    """Audit trail perubahan data oleh admin.
+
+    log() hanya memasukkan entri ke queue; thread background menulisnya ke
+    tabel audit_log dengan multi-row INSERT per batch. Jika database gagal,
+    batch ditulis ke file log lokal (AUDIT_LOG_FILE) dengan rotasi.
+    """
+
+    INSERT_SQL = """INSERT INTO audit_log (id_user, username, aksi, tabel, id_record, perubahan, waktu)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s)"""
+    HIDDEN_FIELDS = ('password',)
+
+    def __init__(self, batch_size=None, flush_interval=None):
+        self.batch_size = batch_size or int(os.getenv('AUDIT_BATCH_SIZE', 50))
+        self.flush_interval = flush_interval or float(os.getenv('AUDIT_FLUSH_INTERVAL', 2))
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._db = Database()
+        self._fallback = None
+
+    @classmethod
+    def diff(cls, sebelum, sesudah):
+        """Kembalikan field yang berubah sebagai {field: [sebelum, sesudah]}."""
+        sebelum = sebelum or {}
+        sesudah = sesudah or {}
+        # Untuk update cukup bandingkan field yang dikirim form
+        fields = set(sesudah) if sebelum and sesudah else set(sebelum) | set(sesudah)
+        perubahan = {}
+        for field in sorted(fields):
+            lama = sebelum.get(field)
+            baru = sesudah.get(field)
+            if field in cls.HIDDEN_FIELDS:
+                if baru:
+                    perubahan[field] = '(diubah)'
+                continue
+            if sebelum and sesudah and str(lama) == str(baru):
+                continue
+            perubahan[field] = [lama, baru]
+        return perubahan
+
+    def log(self, id_user, username, aksi, tabel, id_record=None, sebelum=None, sesudah=None):
+        perubahan = json.dumps(self.diff(sebelum, sesudah), default=str, ensure_ascii=False)
+        self._ensure_started()
+        self._queue.put((id_user, username, aksi, tabel, id_record, perubahan, datetime.now()))
+
+    def _alive(self):
+        return self._thread is not None and self._pid == os.getpid() and self._thread.is_alive()
+
+    def _ensure_started(self):
+        # Thread tidak ikut ter-fork, jadi setiap worker gunicorn memulai writer sendiri.
+        # Writer yang mati juga dijalankan ulang agar queue tidak menumpuk.
+        if self._alive():
+            return
+        with self._lock:
+            if self._alive():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='audit-writer', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            try:
+                self._write(batch)
+            except Exception:
+                logger.exception('%d entri audit tidak bisa ditulis dan dibuang', len(batch))
+
+    def _write(self, batch):
+        try:
+            self._db.executemany(self.INSERT_SQL, batch)
+        except Exception:
+            logger.exception('Gagal menulis %d entri audit ke database', len(batch))
+            self._write_file(batch)
+        finally:
+            for _ in batch:
+                self._queue.task_done()
+
+    def _write_file(self, batch):
+        if self._fallback is None:
+            handler = RotatingFileHandler(
+                os.getenv('AUDIT_LOG_FILE', 'audit.log'),
+                maxBytes=int(os.getenv('AUDIT_LOG_MAX_BYTES', 5 * 1024 * 1024)),
+                backupCount=5,
+                encoding='utf-8'
+            )
+            self._fallback = logging.getLogger('toko_sembako.audit')
+            self._fallback.propagate = False
+            self._fallback.addHandler(handler)
+            self._fallback.setLevel(logging.INFO)
+        for id_user, username, aksi, tabel, id_record, perubahan, waktu in batch:
+            self._fallback.info(json.dumps({
+                'id_user': id_user, 'username': username, 'aksi': aksi, 'tabel': tabel,
+                'id_record': id_record, 'perubahan': json.loads(perubahan),
+                'waktu': waktu.isoformat()
+            }, ensure_ascii=False))
+
+    def flush(self, timeout=None):
+        """Tunggu sampai semua entri di queue sudah ditulis, paling lama timeout detik.
+
+        Return True jika queue sudah kosong.
+        """
+        if not self._alive():
+            return self._queue.unfinished_tasks == 0
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    logger.warning('%d entri audit belum tertulis saat keluar', self._queue.unfinished_tasks)
+                    return False
+                self._queue.all_tasks_done.wait(remaining)
+        return True
+
+
+audit_log = AuditLog()
+atexit.register(audit_log.flush, timeout=float(os.getenv('AUDIT_FLUSH_TIMEOUT', 5)))
@@ -0,0 +1,57 @@
+import pytest
+
+import app as app_module
+from models import Produk
+
+BERAS = {'id_produk': 7, 'kode_produk': 'BRS-001', 'nama': 'Beras 5kg', 'harga': 65000,
+         'harga_tier': [{'min_qty': 1, 'harga': 65000}]}
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(Produk, 'get_produk_by_kode_list',
+                        staticmethod(lambda kode_list: {k: BERAS for k in kode_list if k == 'BRS-001'}))
+    app_module.app.config['TESTING'] = True
+    with app_module.app.test_client() as client:
+        with client.session_transaction() as sess:
+            sess['user_id'] = 1
+            sess['role'] = 'kasir'
+        yield client
+
+
+@pytest.mark.parametrize('body', [{'kode': ['BRS-001', 'XXX']}, ['BRS-001', 'XXX']])
+def test_scan_accepts_object_or_list(client, body):
+    resp = client.post('/produk/scan', json=body)
+
+    assert resp.status_code == 200
+    assert resp.get_json()['produk']['BRS-001']['id_produk'] == 7
+    assert resp.get_json()['tidak_ditemukan'] == ['XXX']
+
+
+@pytest.mark.parametrize('body', ['BRS-001', 42, None, {}])
+def test_scan_rejects_body_without_kode(client, body):
+    resp = client.post('/produk/scan', json=body)
+
+    assert resp.status_code == 400
+    assert resp.get_json() == {'error': 'Parameter kode harus diisi.'}
+
+
+@pytest.mark.parametrize('selesai', ['2025-06-01T08:00', '2025-05-31T23:00'])
+def test_promo_form_rejects_selesai_not_after_mulai(selesai):
+    form = {'nama_promo': 'Promo Beras', 'tipe': 'persen', 'nilai': '10', 'min_qty': '1',
+            'mulai': '2025-06-01T08:00', 'selesai': selesai}
+    with app_module.app.test_request_context('/promo/create', method='POST', data=form):
+        _, error = app_module._promo_form()
+
+    assert error == 'Waktu selesai harus setelah waktu mulai.'
+
+
+def test_promo_form_parses_valid_input():
+    form = {'nama_promo': 'Promo Beras', 'tipe': 'potongan', 'nilai': '500', 'min_qty': '5', 'produk_id': '7',
+            'mulai': '2025-06-01T08:00', 'selesai': '2025-06-02T08:00', 'aktif': '1'}
+    with app_module.app.test_request_context('/promo/create', method='POST', data=form):
+        data, error = app_module._promo_form()
+
+    assert error is None
+    assert (data['nilai'], data['min_qty'], data['produk_id'], data['kategori_id'], data['aktif']) == \
+        (500, 5, 7, None, 1)
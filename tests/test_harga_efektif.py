@@ -0,0 +1,92 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import HargaEfektif
+
+SEKARANG = datetime(2025, 6, 1, 12, 0)
+AWAL, AKHIR = HargaEfektif.AWAL, HargaEfektif.AKHIR
+BERAS = {'id_produk': 7, 'harga': 10000, 'kategori_id': 1}
+
+
+def promo(id_promo, tipe, nilai, min_qty=1, produk_id=7, kategori_id=None, mulai=None, selesai=None):
+    return {'id_promo': id_promo, 'tipe': tipe, 'nilai': nilai, 'min_qty': min_qty, 'produk_id': produk_id,
+            'kategori_id': kategori_id, 'mulai': mulai, 'selesai': selesai}
+
+
+@pytest.mark.parametrize('tipe, nilai, expected', [
+    ('persen', 15, 8500),
+    ('persen', 33, 6700),
+    ('potongan', 2500, 7500),
+    ('potongan', 12000, 0),
+    ('harga', 9000, 9000),
+])
+def test_hitung(tipe, nilai, expected):
+    assert HargaEfektif.hitung(10000, promo(1, tipe, nilai)) == expected
+
+
+def test_future_promo_split_into_segments_per_tier():
+    mulai, selesai = SEKARANG + timedelta(days=1), SEKARANG + timedelta(days=3)
+    promo_list = [promo(1, 'persen', 10, mulai=mulai, selesai=selesai),
+                  promo(2, 'potongan', 500, min_qty=5)]
+
+    rows = HargaEfektif.build_rows(BERAS, promo_list, SEKARANG)
+
+    assert rows == [
+        (7, 1, AWAL, mulai, 10000, 10000, None),
+        (7, 1, mulai, selesai, 9000, 10000, 1),
+        (7, 1, selesai, AKHIR, 10000, 10000, None),
+        (7, 5, AWAL, mulai, 9500, 10000, 2),
+        (7, 5, mulai, selesai, 9000, 10000, 1),
+        (7, 5, selesai, AKHIR, 9500, 10000, 2),
+    ]
+
+
+def test_adjacent_segments_with_same_price_are_merged():
+    mulai, selesai = SEKARANG + timedelta(days=1), SEKARANG + timedelta(days=3)
+    promo_list = [promo(1, 'persen', 10, mulai=mulai, selesai=selesai),
+                  promo(2, 'potongan', 2000, min_qty=5)]
+
+    rows = HargaEfektif.build_rows(BERAS, promo_list, SEKARANG)
+
+    assert [row for row in rows if row[1] == 5] == [(7, 5, AWAL, AKHIR, 8000, 10000, 2)]
+
+
+def test_expired_promo_only_leaves_base_price():
+    mulai, selesai = SEKARANG - timedelta(days=7), SEKARANG - timedelta(days=1)
+
+    rows = HargaEfektif.build_rows(BERAS, [promo(1, 'persen', 50, mulai=mulai, selesai=selesai)], SEKARANG)
+
+    assert rows == [(7, 1, selesai, AKHIR, 10000, 10000, None)]
+
+
+def test_segment_already_started_is_kept():
+    selesai = SEKARANG + timedelta(hours=2)
+
+    rows = HargaEfektif.build_rows(BERAS, [promo(1, 'persen', 20, selesai=selesai)], SEKARANG)
+
+    assert rows == [(7, 1, AWAL, selesai, 8000, 10000, 1),
+                    (7, 1, selesai, AKHIR, 10000, 10000, None)]
+
+
+def test_harga_promo_above_base_price_is_ignored():
+    rows = HargaEfektif.build_rows(BERAS, [promo(1, 'harga', 12000)], SEKARANG)
+
+    assert rows == [(7, 1, AWAL, AKHIR, 10000, 10000, None)]
+
+
+def test_best_price_wins_among_overlapping_promos():
+    promo_list = [promo(1, 'persen', 10), promo(2, 'potongan', 1500, produk_id=None, kategori_id=1),
+                  promo(3, 'harga', 9200)]
+
+    rows = HargaEfektif.build_rows(BERAS, promo_list, SEKARANG)
+
+    assert rows == [(7, 1, AWAL, AKHIR, 8500, 10000, 2)]
+
+
+def test_promo_for_other_produk_or_kategori_is_ignored():
+    promo_list = [promo(1, 'persen', 50, produk_id=8), promo(2, 'persen', 50, produk_id=None, kategori_id=2)]
+
+    rows = HargaEfektif.build_rows(BERAS, promo_list, SEKARANG)
+
+    assert rows == [(7, 1, AWAL, AKHIR, 10000, 10000, None)]
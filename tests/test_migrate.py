@@ -0,0 +1,36 @@
+import pytest
+
+from migrate import Migrator, MigrationError
+
+
+class FakeDatabase:
+    def __init__(self):
+        self.applied = []
+
+    def execute(self, sql, params=None):
+        if sql.startswith('INSERT INTO schema_migrations'):
+            self.applied.append(params[0])
+        return 0
+
+    def fetchall(self, sql, params=None):
+        return [{'version': version} for version in self.applied]
+
+
+@pytest.fixture
+def migrator(tmp_path):
+    for version in ('001', '002', '003', '004'):
+        (tmp_path / f'{version}_contoh.py').write_text('def up(m):\n    pass\n')
+    return Migrator(FakeDatabase(), path=str(tmp_path))
+
+
+@pytest.mark.parametrize('target', ['2', '002', 2])
+def test_up_stops_at_target_version(migrator, target):
+    assert migrator.up(target) == ['001', '002']
+    assert migrator.up() == ['003', '004']
+
+
+@pytest.mark.parametrize('target', ['9', 'abc', '0'])
+def test_up_rejects_unknown_target(migrator, target):
+    with pytest.raises(MigrationError):
+        migrator.up(target)
+    assert migrator.db.applied == []
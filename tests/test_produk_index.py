@@ -0,0 +1,91 @@
+import pytest
+
+import models
+from models import ProdukIndex
+
+
+class FakeDatabase:
+    """Database palsu untuk index produk: menghitung query ke tabel produk."""
+
+    offline = False
+
+    def __init__(self, produk):
+        self.produk = produk
+        self.queries = []
+
+    def fetchall(self, sql, params=None):
+        if 'harga_efektif' in sql:
+            return []
+        self.queries.append(sql)
+        if 'IN (' in sql:
+            wanted = {p.lower() for p in params}
+            return [dict(p) for p in self.produk if p['kode_produk'].lower() in wanted]
+        return [dict(p) for p in self.produk]
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    database = FakeDatabase([{'id_produk': 7, 'kode_produk': 'BRS-001', 'nama': 'Beras 5kg', 'harga': 65000}])
+    monkeypatch.setattr(models, 'db', database)
+    return database
+
+
+def test_unknown_codes_fetched_in_one_query_and_remembered(fake_db):
+    index = ProdukIndex(ttl=60)
+    index.get_many(['BRS-001'])
+    fake_db.queries.clear()
+
+    kode_list = ['XX-%03d' % i for i in range(50)]
+    assert index.get_many(kode_list) == {}
+    assert len(fake_db.queries) == 1
+
+    assert index.get_many(kode_list) == {}
+    assert len(fake_db.queries) == 1
+
+
+def test_new_product_found_via_batch_and_case_insensitive(fake_db):
+    index = ProdukIndex(ttl=60)
+    index.get_many(['BRS-001'])
+    fake_db.produk.append({'id_produk': 8, 'kode_produk': 'GLA-001', 'nama': 'Gula', 'harga': 15000})
+
+    found = index.get_many(['gla-001', 'BRS-001'])
+
+    assert found['gla-001']['id_produk'] == 8
+    assert found['gla-001']['harga_tier'] == [{'min_qty': 1, 'harga': 15000}]
+    assert index.get('GLA-001')['id_produk'] == 8
+
+
+def test_refresh_clears_not_found_cache(fake_db):
+    index = ProdukIndex(ttl=60)
+    assert index.get('GLA-001') is None
+    fake_db.produk.append({'id_produk': 8, 'kode_produk': 'GLA-001', 'nama': 'Gula', 'harga': 15000})
+
+    index.refresh('GLA-001')
+
+    assert index.get('GLA-001')['id_produk'] == 8
+
+
+def test_expired_index_reloaded_in_background(fake_db, monkeypatch):
+    index = ProdukIndex(ttl=0)
+    index.get('BRS-001')
+    fake_db.produk[0] = dict(fake_db.produk[0], harga=60000)
+    reloads = []
+    monkeypatch.setattr(models, 'Database', lambda: fake_db)
+    original_reload = index._reload
+    monkeypatch.setattr(index, '_reload', lambda: reloads.append(original_reload()))
+    threads = []
+    original_thread = models.threading.Thread
+
+    def thread(**kwargs):
+        t = original_thread(**kwargs)
+        threads.append(t)
+        return t
+    monkeypatch.setattr(models.threading, 'Thread', thread)
+
+    # Request tetap dijawab dari data lama selagi index dimuat ulang
+    assert index.get('BRS-001')['harga'] in (65000, 60000)
+    for t in threads:
+        t.join()
+
+    assert len(reloads) == 1
+    assert index._by_kode['BRS-001']['harga'] == 60000
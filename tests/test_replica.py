@@ -0,0 +1,217 @@
+import json
+import sqlite3
+
+import pymysql.err
+import pytest
+
+import models
+from models import ReplicaDatabase
+
+INSERT_KATEGORI = """INSERT INTO kategori (kode_kategori, nama_kategori, deskripsi, lokasi_rak)
+                     VALUES (%s, %s, %s, %s)"""
+INSERT_PRODUK = """INSERT INTO produk (kode_produk, nama, harga, stok, kategori_id)
+                   VALUES (%s, %s, %s, %s, %s)"""
+UPDATE_PRODUK = """UPDATE produk
+                   SET kode_produk = %s, nama = %s, harga = %s, stok = %s, kategori_id = %s
+                   WHERE id_produk = %s"""
+DELETE_PRODUK = "DELETE FROM produk WHERE id_produk = %s"
+
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+        self.lastrowid = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        self.connection.log.append((sql, params))
+        if params and params[0] in self.connection.reject:
+            raise pymysql.err.IntegrityError(1062, "Duplicate entry '%s'" % params[0])
+        if sql.lstrip().upper().startswith('INSERT'):
+            self.connection.next_id += 1
+            self.lastrowid = self.connection.next_id
+
+
+class FakeConnection:
+    """Primary MySQL palsu: mencatat query dan menolak kode tertentu."""
+
+    def __init__(self, reject=()):
+        self.reject = set(reject)
+        self.log = []
+        self.next_id = 100
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def begin(self):
+        pass
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def sent(self):
+        return [(sql, params) for sql, params in self.log if 'SAVEPOINT' not in sql]
+
+
+@pytest.fixture
+def replica(tmp_path):
+    db = ReplicaDatabase(str(tmp_path / 'replica.sqlite3'))
+    db.connection = FakeConnection()
+    db._connect = lambda: None
+    conn = db._local_conn()
+    conn.execute("INSERT INTO kategori VALUES (1, 'KAT-001', 'Beras', '', 'A1')")
+    conn.execute("INSERT INTO produk VALUES (7, 'BRS-001', 'Beras 5kg', 65000, 10, 1)")
+    return db
+
+
+def pending(db):
+    return [dict(row) for row in db._local_conn().execute("SELECT * FROM pending_writes ORDER BY id")]
+
+
+@pytest.mark.parametrize('sql, column, expected', [
+    (UPDATE_PRODUK, 'stok', 3),
+    (UPDATE_PRODUK, 'id_produk', 5),
+    (UPDATE_PRODUK, 'kategori_id', 4),
+    (INSERT_PRODUK, 'kategori_id', 4),
+    (INSERT_PRODUK, 'kode_produk', 0),
+    (DELETE_PRODUK, 'id_produk', 0),
+    (DELETE_PRODUK, 'stok', None),
+    ("UPDATE produk SET kode_produk = %s WHERE id_produk = %s", 'kode_produk', 0),
+])
+def test_param_index(sql, column, expected):
+    assert ReplicaDatabase._param_index(sql, column) == expected
+
+
+def test_stok_update_queued_as_delta(replica):
+    replica._queue_write(UPDATE_PRODUK, ('BRS-001', 'Beras 5kg', 65000, 4, 1, 7))
+
+    [write] = pending(replica)
+    assert 'stok = GREATEST(stok + %s, 0)' in write['sql']
+    assert json.loads(write['params'])[3] == -6
+    stok = replica._local_conn().execute("SELECT stok FROM produk WHERE id_produk = 7").fetchone()[0]
+    assert stok == 4
+
+
+def test_offline_insert_gets_negative_id(replica):
+    _, id_kategori = replica._queue_write(INSERT_KATEGORI, ('KAT-002', 'Minyak', '', 'B1'))
+    _, id_produk = replica._queue_write(INSERT_PRODUK, ('MYK-001', 'Minyak 1L', 18000, 5, id_kategori))
+    _, id_produk_2 = replica._queue_write(INSERT_PRODUK, ('MYK-002', 'Minyak 2L', 35000, 5, id_kategori))
+
+    assert id_kategori == -1
+    assert (id_produk, id_produk_2) == (-1, -2)
+    assert [w['local_id'] for w in pending(replica)] == [-1, -1, -2]
+    row = replica._local_conn().execute("SELECT * FROM produk WHERE kode_produk = 'MYK-002'").fetchone()
+    assert (row['id_produk'], row['kategori_id']) == (-2, -1)
+
+
+def test_reconcile_remaps_local_ids(replica):
+    _, id_kategori = replica._queue_write(INSERT_KATEGORI, ('KAT-002', 'Minyak', '', 'B1'))
+    _, id_produk = replica._queue_write(INSERT_PRODUK, ('MYK-001', 'Minyak 1L', 18000, 5, id_kategori))
+    replica._queue_write(UPDATE_PRODUK, ('MYK-001', 'Minyak 1L', 18000, 2, id_kategori, id_produk))
+
+    assert replica.reconcile() == 3
+
+    sent = replica.connection.sent()
+    assert sent[1][1] == ['MYK-001', 'Minyak 1L', 18000, 5, 101]
+    assert 'GREATEST' in sent[2][0]
+    assert sent[2][1] == ['MYK-001', 'Minyak 1L', 18000, -3, 101, 102]
+    assert pending(replica) == []
+    assert replica._local_conn().execute("SELECT COUNT(*) FROM id_map").fetchone()[0] == 0
+    assert replica._affected == {102}
+
+
+def test_reconcile_fails_writes_of_rejected_insert(replica):
+    _, ditolak = replica._queue_write(INSERT_KATEGORI, ('KAT-001-B', 'Beras', '', 'A1'))
+    _, id_produk = replica._queue_write(INSERT_PRODUK, ('BRS-002', 'Beras 10kg', 120000, 3, ditolak))
+    replica._queue_write(INSERT_PRODUK, ('GLA-001', 'Gula 1kg', 15000, 8, 1))
+    replica._queue_write(DELETE_PRODUK, (id_produk,))
+    replica.connection.reject.add('KAT-001-B')
+
+    assert replica.reconcile() == 1
+
+    sent = replica.connection.sent()
+    assert [params[0] for _, params in sent] == ['KAT-001-B', 'GLA-001']
+    assert all(isinstance(p, str) or p >= 0 for _, params in sent for p in params)
+    errors = [(w['sql'].split()[0], w['error']) for w in pending(replica)]
+    assert [sql for sql, _ in errors] == ['INSERT', 'INSERT', 'DELETE']
+    assert 'Duplicate entry' in errors[0][1]
+    assert 'gagal dikirim' in errors[1][1] and 'gagal dikirim' in errors[2][1]
+    assert replica._local_conn().execute(
+        "SELECT COUNT(*) FROM pending_writes WHERE error IS NULL").fetchone()[0] == 0
+
+
+def test_reconcile_replays_in_batches(replica):
+    replica.batch_size = 2
+    ids = [replica._queue_write(INSERT_PRODUK, ('PRD-%03d' % i, 'Produk', 1000, 1, 1))[1] for i in range(5)]
+    replica._queue_write(DELETE_PRODUK, (ids[-1],))
+
+    assert replica.reconcile() == 6
+
+    sent = replica.connection.sent()
+    assert [params[0] for _, params in sent[:5]] == ['PRD-%03d' % i for i in range(5)]
+    assert sent[5] == (DELETE_PRODUK, [105])
+    assert replica._affected == {101, 102, 103, 104, 105}
+    assert replica._pending is False
+
+
+def test_non_replicated_query_fails_fast_while_offline(replica):
+    replica._connect = lambda: pytest.fail('primary tidak boleh dihubungi selama jeda retry')
+    replica._mark_offline(pymysql.err.OperationalError(2003, "Can't connect"))
+
+    with pytest.raises(pymysql.err.OperationalError) as exc:
+        replica.fetchall("SELECT * FROM harga_efektif")
+    assert exc.value.args[0] == 2003
+    assert replica.fetchone("SELECT * FROM produk WHERE kode_produk = %s", ('BRS-001',))['id_produk'] == 7
+
+
+def test_promo_prices_refreshed_after_reconcile(replica, monkeypatch):
+    refreshed = []
+    monkeypatch.setattr(models.HargaEfektif, 'refresh', classmethod(lambda cls, **kw: refreshed.append(kw)))
+    replica._sync_if_stale = lambda: None
+    replica._queue_write(UPDATE_PRODUK, ('BRS-001', 'Beras 5kg', 60000, 10, 1, 7))
+    replica.offline = True
+
+    assert replica._ensure_online()
+
+    assert refreshed == [{'produk_ids': [7]}]
+    assert replica._affected == set()
+
+
+def test_sync_with_foreign_queue_schedules_reconcile(replica):
+    replica._queue_write(DELETE_PRODUK, (7,))
+    replica._pending = False  # worker lain yang belum tahu ada antrean
+    replica._synced_at = None
+
+    replica.sync()
+
+    assert replica._pending is True
+    assert replica._synced_at is not None
+    assert replica.connection.log == []
+
+
+def test_locked_replica_defers_reconcile(replica, monkeypatch):
+    monkeypatch.setattr(models.HargaEfektif, 'refresh', classmethod(lambda cls, **kw: None))
+    replica._queue_write(DELETE_PRODUK, (7,))
+    replica._sync_if_stale = lambda: None
+    replica.lock_timeout = 0.05
+    replica._local.close()
+    replica._local = None
+    other = sqlite3.connect(replica.path, isolation_level=None)
+    other.execute("BEGIN IMMEDIATE")
+
+    assert replica._ensure_online() is False
+    assert replica._pending is True
+    assert replica.connection.log == []
+    assert replica.fetchone("SELECT * FROM produk WHERE id_produk = %s", (7,)) is None
+
+    other.execute("ROLLBACK")
+    assert replica._ensure_online() is True
+    assert replica.connection.sent() == [(DELETE_PRODUK, [7])]